@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Dict
 
 
 # Cargar automáticamente el .env (si existe) al inicio
@@ -24,6 +25,100 @@ class Settings(BaseSettings):
    # Serper
    serper_api_key: str = Field(..., env="SERPER_API_KEY")
 
+   # Control de admisión frente a la capacidad de OpenAI
+   admission_global_limit: int = Field(16, env="ADMISSION_GLOBAL_LIMIT")
+   admission_per_user_limit: int = Field(2, env="ADMISSION_PER_USER_LIMIT")
+   admission_interactive_limit: int = Field(12, env="ADMISSION_INTERACTIVE_LIMIT")
+   admission_scoring_limit: int = Field(4, env="ADMISSION_SCORING_LIMIT")
+   admission_interactive_max_waiting: int = Field(32, env="ADMISSION_INTERACTIVE_MAX_WAITING")
+   admission_scoring_max_waiting: int = Field(16, env="ADMISSION_SCORING_MAX_WAITING")
+   admission_max_wait_seconds: float = Field(10.0, env="ADMISSION_MAX_WAIT_SECONDS")
+   admission_retry_after_seconds: int = Field(5, env="ADMISSION_RETRY_AFTER_SECONDS")
+   # Nº de proxies propios delante de la API cuyo X-Forwarded-For es fiable (0 = ninguno)
+   admission_trusted_proxy_hops: int = Field(0, env="ADMISSION_TRUSTED_PROXY_HOPS")
+
+   # Enrutado de modelos por etapa (extracción, resumen, crew)
+   model_cheap: str = Field("gpt-4.1-nano", env="MODEL_CHEAP")
+   model_default: str = Field("gpt-4.1-mini", env="MODEL_DEFAULT")
+   model_strong: str = Field("gpt-4.1", env="MODEL_STRONG")
+   routing_short_conversation_chars: int = Field(1500, env="ROUTING_SHORT_CONVERSATION_CHARS")
+   routing_long_conversation_chars: int = Field(6000, env="ROUTING_LONG_CONVERSATION_CHARS")
+   routing_latency_targets: Dict[str, float] = Field(
+      {"extraction": 5.0, "summary": 8.0, "crew": 90.0}, env="ROUTING_LATENCY_TARGETS"
+   )
+   routing_cost_targets: Dict[str, float] = Field(
+      {"extraction": 0.002, "summary": 0.01, "crew": 0.15}, env="ROUTING_COST_TARGETS"
+   )
+   # Las latencias observadas caducan y una fracción del tráfico ignora la
+   # latencia al bajar de nivel, para volver a medir modelos descartados
+   routing_latency_ttl_seconds: float = Field(600.0, env="ROUTING_LATENCY_TTL_SECONDS")
+   routing_exploration_rate: float = Field(0.05, env="ROUTING_EXPLORATION_RATE")
+   routing_log_path: str = Field("data/routing_log.jsonl", env="ROUTING_LOG_PATH")
+
+   # Índice de leads similares (calibración del scoring)
+   # 256 dimensiones: ~10 ms por búsqueda a 100k leads en 1 CPU, y un suelo
+   # de ruido (LeadIndex.noise_floor) que deja pasar leads realmente parecidos
+   lead_index_features: int = Field(256, env="LEAD_INDEX_FEATURES")
+   lead_index_min_similarity: float = Field(0.2, env="LEAD_INDEX_MIN_SIMILARITY")
+   lead_index_calibration_k: int = Field(5, env="LEAD_INDEX_CALIBRATION_K")
+
+   # Snapshot columnar para /analytics
+   analytics_dir: str = Field("data/analytics", env="ANALYTICS_DIR")
+
+   # Análisis especulativo durante la conversación
+   speculative_enabled: bool = Field(True, env="SPECULATIVE_ENABLED")
+   speculative_max_sessions: int = Field(1000, env="SPECULATIVE_MAX_SESSIONS")
+   speculative_session_ttl_seconds: float = Field(3600.0, env="SPECULATIVE_SESSION_TTL_SECONDS")
+   speculative_finish_wait_seconds: float = Field(15.0, env="SPECULATIVE_FINISH_WAIT_SECONDS")
+   speculative_research_wait_seconds: float = Field(1.0, env="SPECULATIVE_RESEARCH_WAIT_SECONDS")
+   speculative_research_max_chars: int = Field(3000, env="SPECULATIVE_RESEARCH_MAX_CHARS")
+
+   # Planificador del crew de scoring (carriles hot/warm/cold)
+   scoring_concurrency: int = Field(2, env="SCORING_CONCURRENCY")
+   scoring_lane_limits: Dict[str, int] = Field(
+      {"hot": 2, "warm": 2, "cold": 1}, env="SCORING_LANE_LIMITS"
+   )
+   scoring_aging_seconds: float = Field(60.0, env="SCORING_AGING_SECONDS")
+   # El crew tarda minutos: colas y espera máxima acordes, y pocos crews por usuario
+   scoring_max_waiting: Dict[str, int] = Field(
+      {"hot": 16, "warm": 16, "cold": 8}, env="SCORING_MAX_WAITING"
+   )
+   scoring_max_wait_seconds: float = Field(300.0, env="SCORING_MAX_WAIT_SECONDS")
+   scoring_per_user_limit: int = Field(2, env="SCORING_PER_USER_LIMIT")
+   scoring_retry_after_seconds: int = Field(30, env="SCORING_RETRY_AFTER_SECONDS")
+   scoring_budget_hot: float = Field(20000.0, env="SCORING_BUDGET_HOT")
+   scoring_budget_warm: float = Field(5000.0, env="SCORING_BUDGET_WARM")
+   scoring_company_size_hot: int = Field(250, env="SCORING_COMPANY_SIZE_HOT")
+   scoring_company_size_warm: int = Field(50, env="SCORING_COMPANY_SIZE_WARM")
+
+   # Variante SSE de /chat/finish
+   finish_stream_heartbeat_seconds: float = Field(15.0, env="FINISH_STREAM_HEARTBEAT_SECONDS")
+
+   # Resiliencia frente a upstreams (OpenAI, Serper, scraping, Airtable)
+   resilience_timeouts: Dict[str, float] = Field(
+      {"openai": 30.0, "openai_stream": 120.0, "serper": 10.0, "scrape": 15.0, "airtable": 10.0},
+      env="RESILIENCE_TIMEOUTS",
+   )
+   resilience_hedge_percentiles: Dict[str, float] = Field(
+      {"serper": 95.0, "scrape": 95.0}, env="RESILIENCE_HEDGE_PERCENTILES"
+   )
+   resilience_max_attempts: int = Field(3, env="RESILIENCE_MAX_ATTEMPTS")
+   resilience_retry_budget_ratio: float = Field(0.2, env="RESILIENCE_RETRY_BUDGET_RATIO")
+   resilience_breaker_failure_threshold: int = Field(5, env="RESILIENCE_BREAKER_FAILURE_THRESHOLD")
+   resilience_breaker_reset_seconds: float = Field(30.0, env="RESILIENCE_BREAKER_RESET_SECONDS")
+   resilience_max_workers: int = Field(32, env="RESILIENCE_MAX_WORKERS")
+
+   # Logging estructurado asíncrono
+   log_level: str = Field("INFO", env="LOG_LEVEL")
+   log_json: bool = Field(True, env="LOG_JSON")
+   log_max_field_chars: int = Field(2000, env="LOG_MAX_FIELD_CHARS")
+   log_sample_rates: Dict[str, float] = Field(
+      {"conversation": 0.1, "lead_data": 1.0}, env="LOG_SAMPLE_RATES"
+   )
+   log_queue_size: int = Field(10000, env="LOG_QUEUE_SIZE")
+   # Volcado de prompts y pasos de los agentes; desactivar en producción
+   crew_verbose: bool = Field(True, env="CREW_VERBOSE")
+
 
    # Datos estáticos del negocio (si no vienen por petición)
    company_name: str = Field(..., env="COMPANY_NAME")
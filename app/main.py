@@ -2,26 +2,71 @@ import uvicorn
 import logging
 import os
 import json
-from datetime import datetime
-from fastapi import FastAPI, HTTPException
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Set
+import asyncio
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import ValidationError
 
 from app.config import settings
 from app.models import (
+    ChatMessage,
     ChatStreamRequest,
     ChatFinishRequest,
-    ChatFinishResponse
+    ChatFinishResponse,
+    SimilarLead,
+    SimilarLeadsResponse,
+    AnalyticsResponse,
+    SchedulerMetricsResponse,
 )
 from app.services.openai_service import OpenAIService, stream_chat
 from app.services.crewai_service import CrewaiService
-from app.utils.streaming_utils import sse_response_generator
+from app.services.admission_service import (
+    INTERACTIVE,
+    SCORING,
+    AdmissionRejected,
+    admission_controller,
+)
+from app.services.model_router import (
+    STAGE_CREW,
+    STAGE_EXTRACTION,
+    STAGE_SUMMARY,
+    estimate_lead_quality,
+    model_router,
+)
+from app.services.lead_index import (
+    build_calibration_context,
+    lead_id_from_path,
+    lead_index,
+    lead_metadata,
+    lead_text_from_conversation,
+)
+from app.services.speculative_service import speculative_analyzer
+from app.services.analytics_service import analytics_store
+from app.services.scoring_scheduler import classify_lead, scoring_scheduler
+from app.utils.logging_utils import setup_logging
+from app.utils.streaming_utils import (
+    CleanupStreamingResponse,
+    pipeline_event_stream,
+    sse_response_generator,
+)
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging: JSON, recortado, muestreado y escrito en un hilo aparte
+setup_logging(
+    level=logging.getLevelName(settings.log_level.upper()),
+    json_output=settings.log_json,
+    max_field_chars=settings.log_max_field_chars,
+    sample_rates=settings.log_sample_rates,
+    queue_size=settings.log_queue_size,
+)
 logger = logging.getLogger(__name__)
 
+# Tareas en segundo plano que deben sobrevivir a la petición que las lanzó
+_background_tasks: Set[asyncio.Task] = set()
+
 app = FastAPI(
     title="Chatbot API con Streaming y Crewai → Airtable",
     version="1.0.0",
@@ -41,38 +86,219 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def load_lead_index():
+    # Indexar los leads ya guardados sin bloquear el event loop
+    added = await asyncio.to_thread(lead_index.load_directory, "data")
+    logger.info("Índice de leads similares cargado con %d leads", added)
+    added = await asyncio.to_thread(analytics_store.sync_directory, "data")
+    logger.info("Snapshot de analítica sincronizado: %d leads nuevos", added)
+
+
+def _client_key(
+    user_id: Optional[str],
+    session_id: Optional[str],
+    http_request: Request,
+) -> str:
+    """
+    Clave para el límite por usuario, de más a menos específica:
+    1) user_id, si el integrador lo envía.
+    2) session_id: el widget no conoce al usuario pero sí genera una sesión
+       por visitante. Detrás de un proxy la IP sería la misma para todos y el
+       límite por usuario acabaría siendo un límite de todo el servicio.
+    3) La IP del cliente. Con `admission_trusted_proxy_hops` > 0 se toma de
+       X-Forwarded-For, contando desde la derecha las entradas que añaden
+       nuestros proxies (las de la izquierda las controla el cliente).
+
+    El session_id lo elige el cliente, así que este límite reparte capacidad
+    entre visitantes legítimos; frente a abusos protegen los límites globales.
+    """
+    if user_id:
+        return f"user:{user_id}"
+    if session_id:
+        return f"session:{session_id}"
+    hops = settings.admission_trusted_proxy_hops
+    forwarded = [
+        part.strip()
+        for part in http_request.headers.get("x-forwarded-for", "").split(",")
+        if part.strip()
+    ]
+    if hops > 0 and len(forwarded) >= hops:
+        return f"ip:{forwarded[-hops]}"
+    host = http_request.client.host if http_request.client else "unknown"
+    return f"ip:{host}"
+
+
+def _too_many_requests(exc: AdmissionRejected) -> HTTPException:
+    logger.warning(f"Petición rechazada por sobrecarga ({exc.lane}): {exc.reason}")
+    return HTTPException(
+        status_code=429,
+        detail="Servicio saturado, inténtalo de nuevo en unos segundos.",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.post("/chat/stream")
-async def chat_stream(request: ChatStreamRequest):
+async def chat_stream(request: ChatStreamRequest, http_request: Request):
     if not request.messages or len(request.messages) < 1:
         raise HTTPException(status_code=400, detail="La conversación debe incluir al menos 1 mensaje.")
 
+    # El chat interactivo tiene prioridad sobre el scoring al repartir capacidad
+    user_key = _client_key(request.user_id, request.session_id, http_request)
+    try:
+        ticket = await admission_controller.acquire_ticket(INTERACTIVE, user_key)
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+
     async def event_generator():
-        async for chunk in stream_chat(
-            request.messages,
-            assistant_id=settings.openai_assistant_id
-        ):
-            yield chunk
+        reply_parts = []
+        try:
+            async for chunk in stream_chat(
+                request.messages,
+                assistant_id=settings.openai_assistant_id
+            ):
+                reply_parts.append(chunk["delta"])
+                yield chunk
+        finally:
+            ticket.release()
+
+        # Turno completo: adelantar en segundo plano el análisis del lead. Si
+        # stream_chat falla, el error se propaga y no se analiza un turno a medias
+        if settings.speculative_enabled and request.session_id:
+            reply = "".join(reply_parts).strip()
+            speculative_analyzer.schedule(
+                request.session_id,
+                request.messages + [ChatMessage(role="assistant", content=reply)],
+                user_key,
+            )
 
-    return StreamingResponse(
+    # Si la respuesta falla o se cancela antes de iterar el generador, el
+    # hueco se devuelve igualmente al cerrarla
+    return CleanupStreamingResponse(
         sse_response_generator(event_generator()),
+        on_close=ticket.release,
         media_type="text/event-stream",
     )
 
 
 @app.post("/chat/finish", response_model=ChatFinishResponse)
-async def chat_finish(request: ChatFinishRequest):
+async def chat_finish(request: ChatFinishRequest, http_request: Request):
+    user_key = _client_key(request.user_id, request.session_id, http_request)
     try:
+        async with admission_controller.slot(SCORING, user_key) as ticket:
+            return await _process_chat_finish(
+                request, user_key, release_admission=ticket.release
+            )
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+
+
+@app.post("/chat/finish/stream")
+async def chat_finish_stream(request: ChatFinishRequest, http_request: Request):
+    """
+    Variante SSE de /chat/finish: emite un evento por etapa (extracted_data,
+    summary, queued, crew_task, crewai_result, stored) y termina con `result`, cuyo
+    contenido es el mismo ChatFinishResponse, o con `error`. Mientras tanto
+    envía heartbeats para que los proxies no corten la conexión.
+    """
+    user_key = _client_key(request.user_id, request.session_id, http_request)
+    try:
+        ticket = await admission_controller.acquire_ticket(SCORING, user_key)
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
+
+    async def pipeline(emit: Callable[[str, Any], None]) -> ChatFinishResponse:
+        try:
+            return await _process_chat_finish(
+                request, user_key, emit=emit, release_admission=ticket.release
+            )
+        finally:
+            ticket.release()
+
+    # Si el cliente se desconecta, el lead se termina de procesar igualmente
+    task, events = pipeline_event_stream(
+        pipeline, heartbeat_seconds=settings.finish_stream_heartbeat_seconds
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
+def _no_emit(event: str, data: Any) -> None:
+    pass
+
+
+def _crew_task_callback(emit: Callable[[str, Any], None]) -> Callable[[Any], None]:
+    """
+    Callback de crewAI (se ejecuta en el hilo del crew) que publica la
+    salida de cada tarea como evento de progreso.
+    """
+    def _on_task_output(task_output: Any) -> None:
+        emit("crew_task", {
+            "task": getattr(task_output, "name", None) or getattr(task_output, "description", ""),
+            "agent": getattr(task_output, "agent", ""),
+            "output": getattr(task_output, "raw", str(task_output)),
+        })
+    return _on_task_output
+
+
+async def _process_chat_finish(
+    request: ChatFinishRequest,
+    user_key: str,
+    emit: Callable[[str, Any], None] = _no_emit,
+    release_admission: Callable[[], None] = lambda: None,
+) -> ChatFinishResponse:
+    """
+    Pipeline completo de cierre. `emit(evento, datos)` recibe el resultado de
+    cada etapa en cuanto termina (lo usa la variante SSE de /chat/finish).
+    `release_admission` devuelve el hueco de admisión antes de esperar turno
+    para el crew: la admisión acota la extracción y el resumen, y el orden y
+    la concurrencia del crew los decide el planificador por carriles, que
+    también acota su cola y los crews por `user_key` (429 si se superan).
+    """
+    try:
+        started = time.perf_counter()
+        models_used = {}
+
         # 1) Construir el texto completo de la conversación
         full_conv = "\n".join(
             f"{'USER' if m.role == 'user' else 'ASSISTANT'}: {m.content}"
             for m in request.messages
         )
-        logger.info(f"Full conversation:\n{full_conv}")
+        logger.info(
+            "Conversación completa",
+            extra={"category": "conversation", "fields": {
+                "session_id": request.session_id, "conversation": full_conv,
+            }},
+        )
+
+        # Análisis adelantado durante la conversación (solo falta el último tramo)
+        speculative = None
+        if settings.speculative_enabled and request.session_id:
+            speculative = await speculative_analyzer.finalize(
+                request.session_id, request.messages
+            )
 
         # 2) Extraer datos estructurados del lead
         try:
-            extracted_data = await OpenAIService.extract_lead_data(full_conv)
-            logger.info(f"Extracted data: {extracted_data}")
+            if speculative is not None:
+                extracted_data = speculative.extracted
+                models_used[STAGE_EXTRACTION] = "speculative"
+            else:
+                decision = model_router.route(STAGE_EXTRACTION, conversation_chars=len(full_conv))
+                with model_router.track(decision):
+                    extracted_data = await OpenAIService.extract_lead_data(
+                        full_conv, model=decision.model
+                    )
+                models_used[STAGE_EXTRACTION] = decision.model
+            logger.info(
+                "Datos extraídos",
+                extra={"category": "lead_data", "fields": {
+                    "session_id": request.session_id, "extracted_data": extracted_data,
+                }},
+            )
+            emit("extracted_data", extracted_data)
         except Exception as e:
             logger.exception("Error extrayendo datos del lead")
             raise HTTPException(
@@ -80,35 +306,99 @@ async def chat_finish(request: ChatFinishRequest):
                 detail=f"Error extrayendo datos del lead: {e}"
             )
 
-        # 3) Ejecutar CrewAI y obtener CrewaiResult directamente
+        # La calidad estimada del lead decide el modelo del crew y del resumen
+        lead_quality = estimate_lead_quality(extracted_data)
+
+        # Leads parecidos ya puntuados como referencia de calibración
+        lead_text = lead_text_from_conversation(full_conv)
+        similar_leads = await asyncio.to_thread(
+            lead_index.search, lead_text, k=settings.lead_index_calibration_k
+        )
+        calibration_context = build_calibration_context(
+            similar_leads,
+            min_similarity=max(settings.lead_index_min_similarity, lead_index.noise_floor()),
+        )
+
+        # 3) Generar resumen/insights con OpenAI
         try:
-            crewai_result = CrewaiService.run_lead_scoring(
-                form_response=full_conv,
-                additional_info=extracted_data
+            if speculative is not None and speculative.summary:
+                summary_text = speculative.summary
+                models_used[STAGE_SUMMARY] = "speculative"
+            else:
+                decision = model_router.route(
+                    STAGE_SUMMARY, conversation_chars=len(full_conv), lead_quality=lead_quality
+                )
+                with model_router.track(decision):
+                    summary_text = await OpenAIService.summarize_conversation(
+                        request.messages,
+                        assistant_id=settings.openai_assistant_id,
+                        model=decision.model,
+                    )
+                models_used[STAGE_SUMMARY] = decision.model
+            logger.info(
+                "Resumen generado",
+                extra={"category": "lead_data", "fields": {
+                    "session_id": request.session_id, "summary": summary_text,
+                }},
             )
-            logger.info(f"CrewAI result: {crewai_result}")
-        except HTTPException:
-            # Re-lanzar HTTPException para respetar código y detalle
-            raise
+            emit("summary", {"summary": summary_text})
         except Exception as e:
-            logger.exception("Error en Crewai")
+            logger.exception("Error al resumir conversación")
             raise HTTPException(
                 status_code=500,
-                detail=f"Error en Crewai: {e}"
+                detail=f"Error al resumir conversación: {e}"
             )
 
-        # 4) Generar resumen/insights con OpenAI
+        # 4) Ejecutar CrewAI y obtener CrewaiResult directamente
         try:
-            summary_text = await OpenAIService.summarize_conversation(
-                request.messages,
-                assistant_id=settings.openai_assistant_id
+            decision = model_router.route(
+                STAGE_CREW, conversation_chars=len(full_conv), lead_quality=lead_quality
+            )
+            models_used[STAGE_CREW] = decision.model
+
+            # Los leads con más intención pasan antes por el crew
+            lane, signals = classify_lead(extracted_data)
+            emit("queued", {"lane": lane, **signals})
+            release_admission()
+            async with scoring_scheduler.slot(lane, user_key) as queue_wait:
+                logger.info(
+                    "Turno de scoring",
+                    extra={"fields": {
+                        "session_id": request.session_id,
+                        "lane": lane,
+                        "queue_wait_seconds": round(queue_wait, 3),
+                        **signals,
+                    }},
+                )
+                with model_router.track(decision):
+                    # En un hilo aparte para no bloquear el event loop
+                    crewai_result = await asyncio.to_thread(
+                        CrewaiService.run_lead_scoring,
+                        form_response=full_conv,
+                        additional_info=extracted_data,
+                        llm_model=decision.model,
+                        calibration_context=calibration_context,
+                        research_context=speculative.research if speculative else "",
+                        task_callback=_crew_task_callback(emit),
+                    )
+            logger.info(
+                "Resultado de CrewAI",
+                extra={"category": "lead_data", "fields": {
+                    "session_id": request.session_id, "crewai_result": crewai_result,
+                }},
             )
-            logger.info(f"Summary text: {summary_text}")
+            emit("crewai_result", crewai_result)
+        except AdmissionRejected as e:
+            # Cola del crew llena, espera agotada o demasiados scorings del usuario
+            raise _too_many_requests(e)
+        except HTTPException:
+            # Re-lanzar HTTPException para respetar código y detalle
+            raise
         except Exception as e:
-            logger.exception("Error al resumir conversación")
+            logger.exception("Error en Crewai")
             raise HTTPException(
                 status_code=500,
-                detail=f"Error al resumir conversación: {e}"
+                detail=f"Error en Crewai: {e}"
             )
 
         # 5) Guardar resultado en JSON
@@ -125,6 +415,13 @@ async def chat_finish(request: ChatFinishRequest):
                 "crewai_data": result_dict,
                 "summary": summary_text,
                 "conversation": full_conv,
+                "extracted_data": extracted_data,
+                "metadata": {
+                    "models": models_used,
+                    "scoring_lane": lane,
+                    "queue_wait_seconds": round(queue_wait, 3),
+                    "latency_seconds": round(time.perf_counter() - started, 3),
+                },
                 "timestamp": datetime.now().isoformat()
             }
 
@@ -133,7 +430,11 @@ async def chat_finish(request: ChatFinishRequest):
             with open(filename, "w", encoding="utf-8") as f:
                 json.dump(output_data, f, indent=2, ensure_ascii=False)
 
-            logger.info(f"Datos guardados en: {filename}")
+            logger.info("Datos guardados en: %s", filename)
+
+            lead_id = lead_id_from_path(filename)
+            speculative_analyzer.discard(request.session_id)
+            emit("stored", {"lead_id": lead_id})
 
         except Exception as e:
             logger.exception("Error al guardar datos en JSON")
@@ -142,9 +443,22 @@ async def chat_finish(request: ChatFinishRequest):
                 detail=f"Error al guardar datos: {e}"
             )
 
+        # El lead ya está guardado: si falla el índice de similares solo se registra
+        try:
+            lead_index.add(lead_id, lead_text, lead_metadata(result_dict))
+        except Exception:
+            logger.exception("Error indexando el lead %s", lead_id)
+
+        # Snapshot de analítica; escribe en disco, así que fuera del event loop
+        try:
+            await asyncio.to_thread(analytics_store.append, lead_id, output_data)
+        except Exception:
+            logger.exception("Error añadiendo el lead %s a la analítica", lead_id)
+
         # 6) Responder satisfactoriamente
         return ChatFinishResponse(
             success=True,
+            lead_id=lead_id,
             crewai_result=crewai_result,
             summary=summary_text,
             message="Lead procesado y almacenado correctamente en JSON.",
@@ -161,5 +475,76 @@ async def chat_finish(request: ChatFinishRequest):
         )
 
 
+@app.get("/leads/{lead_id}/similar", response_model=SimilarLeadsResponse)
+async def similar_leads(lead_id: str, k: int = Query(5, ge=1, le=50)):
+    try:
+        results = await asyncio.to_thread(lead_index.similar_to, lead_id, k=k)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Lead no encontrado: {lead_id}")
+    return SimilarLeadsResponse(
+        lead_id=lead_id,
+        similar=[SimilarLead(**r) for r in results],
+    )
+
+
+@app.get("/scheduler/metrics", response_model=SchedulerMetricsResponse)
+async def scheduler_metrics():
+    """
+    Estado de los carriles del crew de scoring: ocupación, cola y tiempos
+    de espera en cola.
+    """
+    return SchedulerMetricsResponse(
+        concurrency=scoring_scheduler.concurrency,
+        aging_seconds=scoring_scheduler.aging_seconds,
+        lanes=scoring_scheduler.stats(),
+    )
+
+
+_ANALYTICS_INTERVALS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+@app.get("/analytics", response_model=AnalyticsResponse)
+async def analytics(
+    metric: str = Query("score", pattern="^(score|budget|latency)$"),
+    group_by: Optional[str] = Query(None, pattern="^(sector|urgency|model)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    days: Optional[int] = Query(None, ge=1, description="Atajo para since = ahora - days"),
+    sector: Optional[str] = None,
+    urgency: Optional[str] = None,
+    model: Optional[str] = None,
+    bins: int = Query(10, ge=1, le=200),
+    percentiles: str = Query("50,90,99"),
+    interval: Optional[str] = Query(None, pattern="^(hour|day|week)$"),
+):
+    if days is not None and since is None:
+        since = datetime.now() - timedelta(days=days)
+    try:
+        quantiles = [float(q) for q in percentiles.split(",") if q.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles debe ser una lista de números")
+    filters = {
+        name: value
+        for name, value in (("sector", sector), ("urgency", urgency), ("model", model))
+        if value
+    }
+    try:
+        # Consulta vectorizada sobre el snapshot entero: fuera del event loop
+        result = await asyncio.to_thread(
+            analytics_store.query,
+            metric=metric,
+            group_by=group_by,
+            since=since,
+            until=until,
+            filters=filters,
+            bins=bins,
+            percentiles=quantiles,
+            interval_seconds=_ANALYTICS_INTERVALS.get(interval),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AnalyticsResponse(**result)
+
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
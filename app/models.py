@@ -1,4 +1,4 @@
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -13,8 +13,11 @@ class ChatMessage(BaseModel):
 class ChatStreamRequest(BaseModel):
     """
     Payload que envía el iframe para solicitar streaming de respuesta.
+    - user_id / session_id son opcionales y se usan para el reparto de capacidad.
     """
     messages: List[ChatMessage]
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
 
 
 class ChatStreamResponseChunk(BaseModel):
@@ -52,7 +55,81 @@ class ChatFinishResponse(BaseModel):
     Respuesta final al front-end con estado de éxito y datos guardados.
     """
     success: bool
+    lead_id: Optional[str] = None
     airtable_record_id: Optional[str] = None
     crewai_result: Optional[CrewaiResult] = None
     summary: Optional[str] = None
     message: Optional[str] = None
+
+
+class SimilarLead(BaseModel):
+    """
+    Lead anterior parecido, con su puntuación y talking points reutilizables.
+    """
+    lead_id: str
+    similarity: float
+    lead_score: Optional[float] = None
+    use_case_summary: str = ""
+    talking_points: List[str] = Field(default_factory=list)
+
+
+class SimilarLeadsResponse(BaseModel):
+    lead_id: str
+    similar: List[SimilarLead]
+
+
+class AnalyticsHistogram(BaseModel):
+    edges: List[float]
+    counts: List[int]
+
+
+class AnalyticsGroup(BaseModel):
+    group: str
+    count: int
+    mean: float
+    percentiles: Dict[str, float]
+
+
+class AnalyticsTimeBucket(BaseModel):
+    start: str
+    count: int
+    mean: float
+
+
+class AnalyticsResponse(BaseModel):
+    """
+    Agregados sobre el snapshot columnar de leads. Las secciones opcionales
+    solo aparecen si se piden (group_by, interval) y hay datos.
+    """
+    metric: str
+    count: int
+    mean: Optional[float] = None
+    percentiles: Optional[Dict[str, float]] = None
+    histogram: Optional[AnalyticsHistogram] = None
+    groups: Optional[List[AnalyticsGroup]] = None
+    timeline: Optional[List[AnalyticsTimeBucket]] = None
+
+
+class SchedulerLaneMetrics(BaseModel):
+    active: int
+    limit: int
+    waiting: int
+    oldest_wait_seconds: float
+    completed: int
+    cancelled: int
+    rejected: int
+    promoted: int
+    wait_p50_seconds: Optional[float] = None
+    wait_p95_seconds: Optional[float] = None
+    wait_max_seconds: Optional[float] = None
+
+
+class SchedulerMetricsResponse(BaseModel):
+    """
+    Métricas por carril (hot/warm/cold) del planificador del crew de scoring.
+    `promoted` cuenta los turnos concedidos por envejecimiento por delante
+    de un carril más prioritario.
+    """
+    concurrency: int
+    aging_seconds: float
+    lanes: Dict[str, SchedulerLaneMetrics]
@@ -0,0 +1,252 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from app.config import settings
+
+# Carriles de admisión, ordenados de mayor a menor prioridad
+INTERACTIVE = "interactive"
+SCORING = "scoring"
+LANES = (INTERACTIVE, SCORING)
+
+
+class AdmissionRejected(Exception):
+    """
+    Se lanza cuando no hay capacidad para admitir la petición: la cola de
+    espera del carril está llena o se agotó el tiempo máximo de espera.
+    """
+
+    def __init__(self, lane: str, retry_after: int, reason: str):
+        super().__init__(f"Capacidad agotada en el carril '{lane}': {reason}")
+        self.lane = lane
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("future", "user_key")
+
+    def __init__(self, future: asyncio.Future, user_key: str):
+        self.future = future
+        self.user_key = user_key
+
+
+class AdmissionTicket:
+    """
+    Hueco concedido en un carril. `release()` es idempotente, así que puede
+    llamarse desde varios caminos de limpieza (fin del stream, cierre de la
+    respuesta...) sin descuadrar los contadores.
+    """
+
+    def __init__(self, controller: "AdmissionController", lane: str, user_key: str):
+        self._controller = controller
+        self.lane = lane
+        self.user_key = user_key
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self._controller.release(self.lane, self.user_key)
+
+
+class AdmissionController:
+    """
+    Control de admisión delante de las llamadas a OpenAI/CrewAI.
+
+    - Un límite global de peticiones concurrentes hacia el upstream.
+    - Un límite por usuario para que nadie acapare la capacidad.
+    - Un presupuesto independiente por carril (chat interactivo / scoring).
+    - Colas de espera acotadas; al desbordarse se rechaza con Retry-After.
+
+    Cuando se libera un hueco se atiende primero al carril interactivo,
+    de modo que el scoring nunca retrasa al chat.
+    """
+
+    def __init__(
+        self,
+        global_limit: int,
+        per_user_limit: int,
+        lane_limits: Dict[str, int],
+        max_waiting: Dict[str, int],
+        max_wait_seconds: float,
+        retry_after_seconds: int,
+    ):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.lane_limits = dict(lane_limits)
+        self.max_waiting = dict(max_waiting)
+        self.max_wait_seconds = max_wait_seconds
+        self.retry_after_seconds = retry_after_seconds
+
+        self._active_total = 0
+        self._active_lane: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._active_user: Dict[str, int] = {}
+        self._waiters: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in LANES}
+        self._rejected: Dict[str, int] = {lane: 0 for lane in LANES}
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            global_limit=settings.admission_global_limit,
+            per_user_limit=settings.admission_per_user_limit,
+            lane_limits={
+                INTERACTIVE: settings.admission_interactive_limit,
+                SCORING: settings.admission_scoring_limit,
+            },
+            max_waiting={
+                INTERACTIVE: settings.admission_interactive_max_waiting,
+                SCORING: settings.admission_scoring_max_waiting,
+            },
+            max_wait_seconds=settings.admission_max_wait_seconds,
+            retry_after_seconds=settings.admission_retry_after_seconds,
+        )
+
+    # ——————————————————————————
+    # API pública
+    # ——————————————————————————
+
+    async def acquire(self, lane: str, user_key: str) -> None:
+        """
+        Espera (de forma acotada) a obtener un hueco en el carril indicado.
+        Lanza AdmissionRejected si la cola está llena o se agota la espera.
+        """
+        self._check_lane(lane)
+        queue = self._waiters[lane]
+        if len(queue) >= self.max_waiting[lane]:
+            self._rejected[lane] += 1
+            raise AdmissionRejected(lane, self.retry_after_seconds, "cola de espera llena")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), user_key)
+        queue.append(waiter)
+        self._dispatch()
+        if waiter.future.done():
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Se concedió justo al expirar: aprovechamos el hueco
+                return
+            self._remove_waiter(lane, waiter)
+            self._rejected[lane] += 1
+            raise AdmissionRejected(lane, self.retry_after_seconds, "tiempo de espera agotado")
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba; si ya teníamos hueco, lo devolvemos
+            if waiter.future.done():
+                self.release(lane, user_key)
+            else:
+                self._remove_waiter(lane, waiter)
+            raise
+
+    def try_acquire(self, lane: str, user_key: str) -> bool:
+        """
+        Admite sin esperar si hay hueco inmediato y nadie esperando con
+        igual o mayor prioridad. Útil para trabajo opcional en segundo plano.
+        """
+        self._check_lane(lane)
+        for other in LANES[: LANES.index(lane) + 1]:
+            if self._waiters[other]:
+                return False
+        if not self._can_admit(lane, user_key):
+            return False
+        self._grant(lane, user_key)
+        return True
+
+    def release(self, lane: str, user_key: str) -> None:
+        """
+        Devuelve el hueco ocupado y despierta a los siguientes en espera.
+        """
+        self._active_total -= 1
+        self._active_lane[lane] -= 1
+        remaining = self._active_user.get(user_key, 0) - 1
+        if remaining > 0:
+            self._active_user[user_key] = remaining
+        else:
+            self._active_user.pop(user_key, None)
+        self._dispatch()
+
+    async def acquire_ticket(self, lane: str, user_key: str) -> AdmissionTicket:
+        """
+        Como acquire(), pero devuelve un ticket con liberación idempotente.
+        """
+        await self.acquire(lane, user_key)
+        return AdmissionTicket(self, lane, user_key)
+
+    @asynccontextmanager
+    async def slot(self, lane: str, user_key: str) -> AsyncIterator[AdmissionTicket]:
+        """
+        El hueco se devuelve al salir del bloque, salvo que se haya liberado
+        antes con `ticket.release()`.
+        """
+        ticket = await self.acquire_ticket(lane, user_key)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            lane: {
+                "active": self._active_lane[lane],
+                "waiting": len(self._waiters[lane]),
+                "rejected": self._rejected[lane],
+            }
+            for lane in LANES
+        }
+
+    # ——————————————————————————
+    # Lógica interna
+    # ——————————————————————————
+
+    def _check_lane(self, lane: str) -> None:
+        if lane not in self.lane_limits:
+            raise ValueError(f"Carril de admisión desconocido: {lane}")
+
+    def _can_admit(self, lane: str, user_key: str) -> bool:
+        return (
+            self._active_total < self.global_limit
+            and self._active_lane[lane] < self.lane_limits[lane]
+            and self._active_user.get(user_key, 0) < self.per_user_limit
+        )
+
+    def _grant(self, lane: str, user_key: str) -> None:
+        self._active_total += 1
+        self._active_lane[lane] += 1
+        self._active_user[user_key] = self._active_user.get(user_key, 0) + 1
+
+    def _dispatch(self) -> None:
+        """
+        Concede huecos a los que esperan, recorriendo los carriles por
+        prioridad y cada cola en orden de llegada. Un waiter bloqueado solo
+        por su límite de usuario no impide avanzar a los de detrás.
+        """
+        for lane in LANES:
+            queue = self._waiters[lane]
+            if not queue:
+                continue
+            for waiter in list(queue):
+                if self._active_total >= self.global_limit:
+                    return
+                if self._active_lane[lane] >= self.lane_limits[lane]:
+                    break
+                if waiter.future.done():
+                    queue.remove(waiter)
+                    continue
+                if self._active_user.get(waiter.user_key, 0) >= self.per_user_limit:
+                    continue
+                queue.remove(waiter)
+                self._grant(lane, waiter.user_key)
+                waiter.future.set_result(None)
+
+    def _remove_waiter(self, lane: str, waiter: _Waiter) -> None:
+        try:
+            self._waiters[lane].remove(waiter)
+        except ValueError:
+            pass
+
+
+# Instancia única global, compartida por todos los endpoints
+admission_controller = AdmissionController.from_settings()
@@ -2,6 +2,15 @@ import os
 import requests
 from typing import Dict, Any
 from app.config import settings
+from app.services.resilience import TransientUpstreamError, get_upstream
+
+# Códigos con los que Airtable rechaza la petición sin procesarla
+_TRANSIENT_STATUS = (429, 502, 503, 504)
+
+airtable_upstream = get_upstream(
+    "airtable",
+    is_retryable=lambda e: isinstance(e, requests.RequestException),
+)
 
 
 class AirtableService:
@@ -26,10 +35,21 @@ class AirtableService:
         }
         data = {"fields": fields}
 
-        resp = requests.post(url, json=data, headers=headers)
-        if resp.status_code not in (200, 201):
-            raise RuntimeError(f"Airtable API error {resp.status_code}: {resp.text}")
+        def _post():
+            resp = requests.post(
+                url,
+                json=data,
+                headers=headers,
+                timeout=airtable_upstream.policy.timeout_seconds,
+            )
+            if resp.status_code in _TRANSIENT_STATUS:
+                raise TransientUpstreamError(f"Airtable API error {resp.status_code}: {resp.text}")
+            if resp.status_code not in (200, 201):
+                raise RuntimeError(f"Airtable API error {resp.status_code}: {resp.text}")
+            return resp
 
+        # Crear un registro no es idempotente: solo se reintentan los rechazos transitorios
+        resp = airtable_upstream.call(_post)
         record = resp.json()
         return record.get("id")
 
@@ -0,0 +1,355 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import settings
+from app.services.lead_index import lead_id_from_path
+
+# Columnas del snapshot y su tipo en disco
+COLUMNS: Dict[str, np.dtype] = {
+    "score": np.dtype(np.float32),
+    "timestamp": np.dtype(np.int64),
+    "sector": np.dtype(np.int32),
+    "urgency": np.dtype(np.int32),
+    "budget": np.dtype(np.float32),
+    "model": np.dtype(np.int32),
+    "latency": np.dtype(np.float32),
+}
+
+# Columnas categóricas: se guardan como códigos enteros + diccionario
+CATEGORICAL = ("sector", "urgency", "model")
+NUMERIC = ("score", "budget", "latency")
+
+_UNKNOWN = ""
+_AMOUNT = r"(\d+(?:[.,]\d+)*)\s*(millones?|mil|k|m)?\b"
+_NUMBER_RE = re.compile(_AMOUNT, re.IGNORECASE)
+_RANGE_RE = re.compile(_AMOUNT + r"\s*(?:-|–|a|y|hasta)\s*" + _AMOUNT, re.IGNORECASE)
+
+
+def _to_amount(number: str, suffix: str) -> float:
+    # "20.000" / "20,000" son separadores de miles; "1,5" / "1.5" decimales
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", number):
+        number = re.sub(r"[.,]", "", number)
+    else:
+        number = number.replace(",", ".")
+    try:
+        amount = float(number)
+    except ValueError:
+        return math.nan
+    suffix = suffix.lower()
+    if suffix in ("k", "mil"):
+        amount *= 1_000
+    elif suffix.startswith("m"):
+        amount *= 1_000_000
+    return amount
+
+
+def parse_budget(value: Any) -> float:
+    """
+    Convierte un presupuesto libre ("5000€", "20.000 €", "10k", "1,5 millones",
+    "entre 3 y 5 mil") en un número; los rangos cuentan por su punto medio.
+    Devuelve NaN si no hay cifra reconocible.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "")
+
+    # Rango: el sufijo del segundo extremo se aplica también al primero
+    match = _RANGE_RE.search(text)
+    if match:
+        low_number, low_suffix, high_number, high_suffix = match.groups()
+        high = _to_amount(high_number, high_suffix or "")
+        low = _to_amount(low_number, low_suffix or high_suffix or "")
+        if low <= high:
+            return (low + high) / 2
+
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return math.nan
+    return _to_amount(match.group(1), match.group(2) or "")
+
+
+class LeadAnalyticsStore:
+    """
+    Snapshot columnar de los leads para analítica.
+
+    Cada columna es un .npy mapeado en memoria (np.memmap) dentro de
+    `directory`; las columnas categóricas se guardan como códigos con su
+    diccionario en meta.json. Las altas son incrementales (una fila por
+    lead) y la capacidad crece por duplicación. Las consultas trabajan
+    directamente sobre los arrays con operaciones vectorizadas de NumPy.
+    """
+
+    def __init__(self, directory: str, initial_capacity: int = 4096):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        meta = self._load_meta()
+        self._size: int = meta.get("size", 0)
+        self._capacity: int = meta.get("capacity", initial_capacity)
+        self._dictionaries: Dict[str, List[str]] = {
+            name: meta.get("dictionaries", {}).get(name, [_UNKNOWN]) for name in CATEGORICAL
+        }
+        self._codes: Dict[str, Dict[str, int]] = {
+            name: {label: i for i, label in enumerate(labels)}
+            for name, labels in self._dictionaries.items()
+        }
+        self._columns: Dict[str, np.memmap] = {
+            name: self._open_column(name, dtype, self._capacity)
+            for name, dtype in COLUMNS.items()
+        }
+        # lead_ids.txt se escribe antes que meta.json: si un alta se cortó
+        # entre ambos, solo cuentan las filas registradas en los dos
+        lead_ids = self._load_lead_ids()
+        if len(lead_ids) != self._size:
+            self._size = min(self._size, len(lead_ids))
+            lead_ids = lead_ids[: self._size]
+            self._rewrite_lead_ids(lead_ids)
+            self._save_meta()
+        self._lead_ids = set(lead_ids)
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ——————————————————————————
+    # Persistencia
+    # ——————————————————————————
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _load_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self._path("meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_meta(self) -> None:
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"size": self._size, "capacity": self._capacity, "dictionaries": self._dictionaries},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, self._path("meta.json"))
+
+    def _load_lead_ids(self) -> List[str]:
+        try:
+            with open(self._path("lead_ids.txt"), encoding="utf-8") as f:
+                return [line.rstrip("\n") for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def _rewrite_lead_ids(self, lead_ids: List[str]) -> None:
+        tmp = self._path("lead_ids.txt.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lead_id + "\n" for lead_id in lead_ids)
+        os.replace(tmp, self._path("lead_ids.txt"))
+
+    def _open_column(self, name: str, dtype: np.dtype, capacity: int) -> np.memmap:
+        path = self._path(f"{name}.npy")
+        if os.path.exists(path):
+            column = np.lib.format.open_memmap(path, mode="r+")
+            if column.shape[0] >= capacity:
+                return column
+            del column
+            return self._grow_column(name, dtype, capacity)
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(capacity,))
+
+    def _grow_column(self, name: str, dtype: np.dtype, capacity: int) -> np.memmap:
+        path = self._path(f"{name}.npy")
+        tmp = self._path(f"{name}.npy.tmp")
+        old = np.lib.format.open_memmap(path, mode="r")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity,))
+        grown[: old.shape[0]] = old
+        grown.flush()
+        del old, grown
+        os.replace(tmp, path)
+        return np.lib.format.open_memmap(path, mode="r+")
+
+    def _encode(self, column: str, label: Any) -> int:
+        label = str(label or _UNKNOWN).strip().lower()
+        code = self._codes[column].get(label)
+        if code is None:
+            code = len(self._dictionaries[column])
+            self._dictionaries[column].append(label)
+            self._codes[column][label] = code
+        return code
+
+    # ——————————————————————————
+    # Altas incrementales
+    # ——————————————————————————
+
+    def append(self, lead_id: str, record: Dict[str, Any]) -> bool:
+        """
+        Añade un lead (mismo formato que los JSON de data/). Devuelve False
+        si ya estaba en el snapshot.
+        """
+        extracted = record.get("extracted_data") or {}
+        metadata = record.get("metadata") or {}
+        crewai_data = record.get("crewai_data") or {}
+        try:
+            timestamp = int(datetime.fromisoformat(record["timestamp"]).timestamp())
+        except (KeyError, TypeError, ValueError):
+            timestamp = int(datetime.now().timestamp())
+        score = crewai_data.get("lead_score")
+        latency = metadata.get("latency_seconds")
+
+        with self._lock:
+            if lead_id in self._lead_ids:
+                return False
+            if self._size == self._capacity:
+                self._capacity *= 2
+                self._columns = {
+                    name: self._grow_column(name, dtype, self._capacity)
+                    for name, dtype in COLUMNS.items()
+                }
+
+            row = self._size
+            self._columns["score"][row] = math.nan if score is None else float(score)
+            self._columns["timestamp"][row] = timestamp
+            self._columns["sector"][row] = self._encode("sector", extracted.get("sector"))
+            self._columns["urgency"][row] = self._encode("urgency", extracted.get("urgencia"))
+            self._columns["budget"][row] = parse_budget(extracted.get("presupuesto"))
+            self._columns["model"][row] = self._encode(
+                "model", (metadata.get("models") or {}).get("crew")
+            )
+            self._columns["latency"][row] = math.nan if latency is None else float(latency)
+            self._size += 1
+            self._lead_ids.add(lead_id)
+
+            for column in self._columns.values():
+                column.flush()
+            with open(self._path("lead_ids.txt"), "a", encoding="utf-8") as f:
+                f.write(lead_id + "\n")
+            self._save_meta()
+        return True
+
+    def sync_directory(self, directory: str = "data") -> int:
+        """
+        Incorpora los lead_*.json que aún no estén en el snapshot.
+        """
+        added = 0
+        for path in sorted(glob.glob(os.path.join(directory, "lead_*.json"))):
+            lead_id = lead_id_from_path(path)
+            if lead_id in self._lead_ids:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            added += self.append(lead_id, record)
+        return added
+
+    # ——————————————————————————
+    # Consultas vectorizadas
+    # ——————————————————————————
+
+    def query(
+        self,
+        metric: str = "score",
+        group_by: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        filters: Optional[Dict[str, str]] = None,
+        bins: int = 10,
+        percentiles: Sequence[float] = (50, 90, 99),
+        interval_seconds: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        if metric not in NUMERIC:
+            raise ValueError(f"Métrica no soportada: {metric}")
+        if group_by is not None and group_by not in CATEGORICAL:
+            raise ValueError(f"No se puede agrupar por: {group_by}")
+
+        with self._lock:
+            size = self._size
+            columns = {name: column[:size] for name, column in self._columns.items()}
+            dictionaries = {name: list(labels) for name, labels in self._dictionaries.items()}
+            codes = {name: dict(mapping) for name, mapping in self._codes.items()}
+
+        # 1) Máscara de filas: ventana temporal, filtros categóricos y valor conocido
+        timestamps = columns["timestamp"]
+        values = columns[metric]
+        mask = ~np.isnan(values)
+        if since is not None:
+            mask &= timestamps >= int(since.timestamp())
+        if until is not None:
+            mask &= timestamps < int(until.timestamp())
+        for column, label in (filters or {}).items():
+            if column not in CATEGORICAL:
+                raise ValueError(f"No se puede filtrar por: {column}")
+            code = codes[column].get(str(label).strip().lower())
+            if code is None:
+                mask[:] = False
+            else:
+                mask &= columns[column] == code
+
+        selected = values[mask].astype(np.float64)
+        result: Dict[str, Any] = {"metric": metric, "count": int(selected.size)}
+        if selected.size == 0:
+            return result
+
+        # 2) Estadísticos globales
+        result["mean"] = float(selected.mean())
+        result["percentiles"] = {
+            f"p{q:g}": float(v)
+            for q, v in zip(percentiles, np.percentile(selected, percentiles))
+        }
+        counts, edges = np.histogram(selected, bins=bins)
+        result["histogram"] = {"edges": edges.tolist(), "counts": counts.tolist()}
+
+        # 3) Group-by: ordenar por grupo (orden estable sobre enteros) y cortar
+        # por fronteras de grupo; los percentiles de cada tramo usan partición
+        if group_by is not None:
+            group_codes = columns[group_by][mask]
+            order = np.argsort(group_codes, kind="stable")
+            sorted_codes = group_codes[order]
+            sorted_values = selected[order]
+            unique, starts, sizes = np.unique(sorted_codes, return_index=True, return_counts=True)
+            sums = np.add.reduceat(sorted_values, starts)
+            groups = []
+            for code, start, n, total in zip(unique, starts, sizes, sums):
+                group_values = sorted_values[start:start + n]
+                groups.append({
+                    "group": dictionaries[group_by][code] or "(desconocido)",
+                    "count": int(n),
+                    "mean": float(total / n),
+                    "percentiles": {
+                        f"p{q:g}": float(v)
+                        for q, v in zip(percentiles, np.percentile(group_values, percentiles))
+                    },
+                })
+            result["groups"] = sorted(groups, key=lambda g: g["count"], reverse=True)
+
+        # 4) Serie temporal por intervalos fijos
+        if interval_seconds:
+            selected_ts = timestamps[mask]
+            origin = int(selected_ts.min()) // interval_seconds * interval_seconds
+            buckets = (selected_ts - origin) // interval_seconds
+            bucket_counts = np.bincount(buckets)
+            bucket_sums = np.bincount(buckets, weights=selected)
+            non_empty = np.nonzero(bucket_counts)[0]
+            result["timeline"] = [
+                {
+                    "start": datetime.fromtimestamp(origin + int(b) * interval_seconds).isoformat(),
+                    "count": int(bucket_counts[b]),
+                    "mean": float(bucket_sums[b] / bucket_counts[b]),
+                }
+                for b in non_empty
+            ]
+        return result
+
+
+# Instancia única global
+analytics_store = LeadAnalyticsStore(settings.analytics_dir)
@@ -1,7 +1,8 @@
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Optional
 from app.config import settings
 from crewai_plus_lead_scoring.crew import CrewaiPlusLeadScoringCrew
 from app.models import CrewaiResult
+from app.services.resilient_tools import resilient_tools
 import json
 
 
@@ -14,9 +15,17 @@ class CrewaiService:
     def run_lead_scoring(
         form_response: str,
         additional_info: Dict[str, Any] = None,
+        llm_model: Optional[str] = None,
+        calibration_context: str = "",
+        research_context: str = "",
+        task_callback: Optional[Callable[[Any], None]] = None,
     ) -> CrewaiResult:
         """
         Lanza el crew secuencial de CrewAI y devuelve un CrewaiResult validado.
+        Si se indica llm_model, todos los agentes usan ese modelo.
+        calibration_context resume leads parecidos ya puntuados y
+        research_context trae la búsqueda previa sobre la empresa, si la hay.
+        task_callback se invoca con la salida de cada tarea según termina.
         """
 
         # 1) Construir inputs para el crew
@@ -26,6 +35,8 @@ class CrewaiService:
             "product_description": settings.product_description,
             "icp_description": settings.icp_description,
             "form_response": form_response,
+            "calibration_context": calibration_context or "No hay leads anteriores comparables.",
+            "research_context": research_context or "(sin investigación previa)",
         }
         if additional_info:
             payload.update(additional_info)
@@ -33,7 +44,13 @@ class CrewaiService:
         # 2) Ejecutar el crew
         try:
             crew = CrewaiPlusLeadScoringCrew()
-            raw_output = crew.crew().kickoff(inputs=payload)
+            crew.llm_model = llm_model
+            crew.tool_factory = resilient_tools
+            crew.verbose_logs = settings.crew_verbose
+            crew_obj = crew.crew()
+            if task_callback:
+                crew_obj.task_callback = task_callback
+            raw_output = crew_obj.kickoff(inputs=payload)
         except Exception as e:
             raise RuntimeError(f"Error al ejecutar el crew de CrewAI: {e}")
 
@@ -0,0 +1,247 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Palabras muy frecuentes que no aportan señal para comparar leads
+_STOPWORDS = frozenset(
+    """
+    que los las del con por para una uno unos unas como pero mas más este esta
+    estos estas ese esa eso muy sin sobre entre hay son ser nos les sus tu tus
+    mi mis yo ella ellos the and for with you your are this that from have
+    hola gracias vale okey sí si
+    """.split()
+)
+
+
+def lead_text_from_conversation(conversation: str) -> str:
+    """
+    Se queda solo con lo que dice el usuario: las preguntas del asistente se
+    repiten en todos los leads y solo añadirían ruido a la similitud.
+    """
+    kept = []
+    is_user = False
+    for line in conversation.splitlines():
+        if line.startswith("USER:"):
+            is_user = True
+            line = line[len("USER:"):]
+        elif line.startswith("ASSISTANT:"):
+            is_user = False
+            continue
+        if is_user:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+class LeadIndex:
+    """
+    Índice vectorial en memoria sobre los leads ya procesados.
+
+    Los embeddings se calculan en local con el truco del hashing (unigramas y
+    bigramas, tf sublineal y normalización L2), así que no hace falta ningún
+    modelo ni llamada externa. La búsqueda es un único producto matriz-vector
+    en NumPy sobre una matriz float32 que crece por duplicación.
+    """
+
+    def __init__(self, n_features: int = 256, initial_capacity: int = 1024):
+        self.n_features = n_features
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((initial_capacity, n_features), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._metadata: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, lead_id: str) -> bool:
+        return lead_id in self._rows
+
+    def noise_floor(self) -> float:
+        """
+        Similitud que ya alcanzan leads sin relación por puro azar. Con textos
+        independientes el coseno se reparte con desviación ~1/sqrt(d) y el
+        máximo entre N leads ronda sqrt(2·ln N / d); se añade una desviación
+        de margen. A 100k leads: ~0.51 con 128 dimensiones, ~0.36 con 256.
+        """
+        size = max(self._size, 2)
+        return math.sqrt(2 * math.log(size) / self.n_features) + 1 / math.sqrt(self.n_features)
+
+    # ——————————————————————————
+    # Embeddings
+    # ——————————————————————————
+
+    def vectorize(self, text: str) -> np.ndarray:
+        tokens = [
+            t for t in _TOKEN_RE.findall(text.lower())
+            if len(t) > 2 and t not in _STOPWORDS
+        ]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter(
+            (zlib.crc32(f.encode("utf-8")) for f in features),
+            dtype=np.uint32,
+            count=len(features),
+        )
+        buckets = (hashes % self.n_features).astype(np.intp)
+        # El bit alto decide el signo para compensar colisiones
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, buckets, signs)
+
+        # tf sublineal conservando el signo
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    # ——————————————————————————
+    # Altas y búsquedas
+    # ——————————————————————————
+
+    def add(self, lead_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Añade (o reemplaza) un lead en el índice.
+        """
+        vector = self.vectorize(text)
+        with self._lock:
+            row = self._rows.get(lead_id)
+            if row is None:
+                if self._size == self._vectors.shape[0]:
+                    grown = np.zeros((self._size * 2, self.n_features), dtype=np.float32)
+                    grown[: self._size] = self._vectors[: self._size]
+                    self._vectors = grown
+                row = self._size
+                self._size += 1
+                self._ids.append(lead_id)
+                self._metadata.append({})
+                self._rows[lead_id] = row
+            self._vectors[row] = vector
+            self._metadata[row] = metadata or {}
+
+    def search(
+        self,
+        text: str,
+        k: int = 5,
+        exclude_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        return self._search_vector(self.vectorize(text), k, exclude_id)
+
+    def similar_to(self, lead_id: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Leads más parecidos a uno ya indexado. KeyError si no existe.
+        """
+        with self._lock:
+            vector = self._vectors[self._rows[lead_id]].copy()
+        return self._search_vector(vector, k, exclude_id=lead_id)
+
+    def _search_vector(
+        self,
+        query: np.ndarray,
+        k: int,
+        exclude_id: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            size = self._size
+            vectors = self._vectors
+            ids = self._ids
+            metadata = self._metadata
+            exclude_row = self._rows.get(exclude_id) if exclude_id else None
+        if size == 0 or k <= 0:
+            return []
+
+        # Los vectores están normalizados: el producto escalar es el coseno
+        scores = vectors[:size] @ query
+        if exclude_row is not None:
+            scores[exclude_row] = -np.inf
+
+        k = min(k, size - (1 if exclude_row is not None else 0))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"lead_id": ids[i], "similarity": float(scores[i]), **metadata[i]}
+            for i in top
+        ]
+
+    # ——————————————————————————
+    # Carga desde disco
+    # ——————————————————————————
+
+    def load_directory(self, directory: str = "data") -> int:
+        """
+        Indexa los JSON lead_*.json ya guardados. Devuelve cuántos se añadieron.
+        """
+        added = 0
+        for path in sorted(glob.glob(os.path.join(directory, "lead_*.json"))):
+            lead_id = lead_id_from_path(path)
+            if lead_id in self:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            self.add(
+                lead_id,
+                lead_text_from_conversation(record.get("conversation") or ""),
+                lead_metadata(record.get("crewai_data") or {}),
+            )
+            added += 1
+        return added
+
+
+def lead_id_from_path(path: str) -> str:
+    """
+    data/lead_<session>_<fecha>.json → <session>_<fecha>
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[len("lead_"):] if stem.startswith("lead_") else stem
+
+
+def lead_metadata(crewai_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "lead_score": crewai_data.get("lead_score"),
+        "use_case_summary": crewai_data.get("use_case_summary", ""),
+        "talking_points": crewai_data.get("talking_points", []),
+    }
+
+
+def build_calibration_context(similar: List[Dict[str, Any]], min_similarity: float = 0.2) -> str:
+    """
+    Texto para el scoring con las puntuaciones y talking points de leads
+    parecidos ya evaluados, como referencia de calibración. `min_similarity`
+    debe quedar por encima de `LeadIndex.noise_floor()` o se colará ruido.
+    """
+    lines = []
+    for lead in similar:
+        if lead["similarity"] < min_similarity or lead.get("lead_score") is None:
+            continue
+        lines.append(
+            f"- Lead parecido (similitud {lead['similarity']:.2f}), "
+            f"puntuación {lead['lead_score']}: {lead.get('use_case_summary', '')}"
+        )
+        for point in lead.get("talking_points", [])[:2]:
+            lines.append(f"    · {point}")
+    if not lines:
+        return "No hay leads anteriores comparables."
+    return "\n".join(lines)
+
+
+# Instancia única global
+lead_index = LeadIndex(n_features=settings.lead_index_features)
@@ -0,0 +1,357 @@
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+# Etapas del pipeline que pasan por el router
+STAGE_EXTRACTION = "extraction"
+STAGE_SUMMARY = "summary"
+STAGE_CREW = "crew"
+
+# Coste aproximado (USD por 1M de tokens de entrada/salida) de cada familia.
+# Se usa solo para estimar el coste de una llamada frente al objetivo.
+MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    "gpt-4.1-nano": {"input": 0.10, "output": 0.40},
+    "gpt-4.1-mini": {"input": 0.40, "output": 1.60},
+    "gpt-4.1": {"input": 2.00, "output": 8.00},
+}
+
+# Rango de niveles permitido por etapa (0 = barato, 1 = por defecto, 2 = potente)
+STAGE_TIER_BOUNDS: Dict[str, tuple] = {
+    STAGE_EXTRACTION: (0, 1),
+    STAGE_SUMMARY: (0, 2),
+    STAGE_CREW: (1, 2),
+}
+
+# Tokens de salida esperados y nº de llamadas al LLM por etapa (el crew
+# encadena tres agentes con varias iteraciones cada uno)
+STAGE_OUTPUT_TOKENS = {STAGE_EXTRACTION: 200, STAGE_SUMMARY: 300, STAGE_CREW: 600}
+STAGE_CALL_FACTOR = {STAGE_EXTRACTION: 1, STAGE_SUMMARY: 1, STAGE_CREW: 9}
+
+# Peso de cada observación nueva en la media móvil de latencia
+_LATENCY_EMA_ALPHA = 0.2
+
+
+def estimate_lead_quality(extracted_data: Optional[Dict[str, Any]]) -> Optional[float]:
+    """
+    Estima la calidad del lead (0-1) a partir de los datos extraídos, sin LLM.
+    Devuelve None si todavía no hay datos (p. ej. antes de la extracción).
+    """
+    if not extracted_data:
+        return None
+
+    def _field(key: str) -> str:
+        value = extracted_data.get(key) or ""
+        return str(value).strip().lower()
+
+    quality = 0.0
+    if _field("empresa"):
+        quality += 0.2
+    if _field("presupuesto"):
+        quality += 0.3
+    urgency = _field("urgencia")
+    if urgency == "alta":
+        quality += 0.3
+    elif urgency == "media":
+        quality += 0.15
+    tone = _field("tono")
+    if tone == "positivo":
+        quality += 0.2
+    elif tone == "negativo":
+        quality -= 0.1
+    return max(0.0, min(1.0, quality))
+
+
+@dataclass
+class RouteDecision:
+    """
+    Decisión de enrutado para una etapa concreta, con el motivo aplicado.
+    """
+    stage: str
+    model: str
+    tier: int
+    reason: str
+    conversation_chars: int
+    lead_quality: Optional[float]
+    estimated_cost_usd: float
+    decision_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+class ModelRouter:
+    """
+    Elige el modelo de cada etapa según la longitud de la conversación, la
+    calidad estimada del lead y los objetivos de latencia y coste.
+
+    - Conversaciones cortas y leads flojos → modelo barato y rápido.
+    - Conversaciones largas o leads valiosos → modelo más potente.
+    - Si el modelo elegido supera el coste objetivo o su latencia observada
+      supera la objetivo, se baja de nivel hasta el mínimo de la etapa.
+    - La latencia observada caduca a los `latency_ttl_seconds` sin nuevas
+      medidas, y una fracción `exploration_rate` de las decisiones ignora la
+      latencia, de modo que un modelo descartado por lentitud se vuelve a
+      medir en lugar de quedar excluido para siempre.
+
+    Cada decisión y su resultado (latencia, éxito) se añade a un JSONL para
+    poder ajustar la política con datos reales. La escritura la hace un hilo
+    aparte, nunca el event loop.
+    """
+
+    def __init__(
+        self,
+        tiers: List[str],
+        short_chars: int,
+        long_chars: int,
+        latency_targets: Dict[str, float],
+        cost_targets: Dict[str, float],
+        log_path: Optional[str],
+        latency_ttl_seconds: float = 600.0,
+        exploration_rate: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.tiers = tiers
+        self.short_chars = short_chars
+        self.long_chars = long_chars
+        self.latency_targets = dict(latency_targets)
+        self.cost_targets = dict(cost_targets)
+        self.log_path = log_path
+        self.latency_ttl_seconds = latency_ttl_seconds
+        self.exploration_rate = exploration_rate
+        self._clock = clock
+        self._rng = rng
+
+        self._lock = threading.Lock()
+        # Latencia media observada por (etapa, modelo) y cuándo se actualizó
+        self._latency_ema: Dict[tuple, float] = {}
+        self._latency_updated_at: Dict[tuple, float] = {}
+        self._outcomes: Dict[tuple, Dict[str, int]] = {}
+
+        self._log_queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._log_writer: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls) -> "ModelRouter":
+        return cls(
+            tiers=[settings.model_cheap, settings.model_default, settings.model_strong],
+            short_chars=settings.routing_short_conversation_chars,
+            long_chars=settings.routing_long_conversation_chars,
+            latency_targets=settings.routing_latency_targets,
+            cost_targets=settings.routing_cost_targets,
+            log_path=settings.routing_log_path,
+            latency_ttl_seconds=settings.routing_latency_ttl_seconds,
+            exploration_rate=settings.routing_exploration_rate,
+        )
+
+    # ——————————————————————————
+    # Decisión
+    # ——————————————————————————
+
+    def route(
+        self,
+        stage: str,
+        conversation_chars: int,
+        lead_quality: Optional[float] = None,
+    ) -> RouteDecision:
+        min_tier, max_tier = STAGE_TIER_BOUNDS[stage]
+        reasons = []
+
+        # 1) Nivel base por longitud de la conversación
+        if conversation_chars <= self.short_chars:
+            tier = 0
+            reasons.append("conversación corta")
+        elif conversation_chars >= self.long_chars:
+            tier = 2
+            reasons.append("conversación larga")
+        else:
+            tier = 1
+            reasons.append("conversación media")
+
+        # 2) Ajuste por calidad estimada del lead
+        if lead_quality is not None:
+            if lead_quality >= 0.6:
+                tier += 1
+                reasons.append(f"lead valioso ({lead_quality:.2f})")
+            elif lead_quality < 0.3:
+                tier -= 1
+                reasons.append(f"lead flojo ({lead_quality:.2f})")
+
+        tier = max(min_tier, min(max_tier, tier))
+
+        # 3) Bajar de nivel mientras se incumplan los objetivos de coste/latencia.
+        # Las decisiones de exploración solo respetan el coste.
+        explore = self.exploration_rate > 0 and self._rng() < self.exploration_rate
+        if explore:
+            reasons.append("exploración")
+        cost = self._estimate_cost(stage, self.tiers[tier], conversation_chars)
+        while tier > min_tier:
+            model = self.tiers[tier]
+            over_cost = cost > self.cost_targets.get(stage, float("inf"))
+            over_latency = not explore and (
+                self._observed_latency(stage, model) > self.latency_targets.get(stage, float("inf"))
+            )
+            if not (over_cost or over_latency):
+                break
+            reasons.append(
+                f"{model} fuera de objetivo ({'coste' if over_cost else 'latencia'})"
+            )
+            tier -= 1
+            cost = self._estimate_cost(stage, self.tiers[tier], conversation_chars)
+
+        return RouteDecision(
+            stage=stage,
+            model=self.tiers[tier],
+            tier=tier,
+            reason="; ".join(reasons),
+            conversation_chars=conversation_chars,
+            lead_quality=lead_quality,
+            estimated_cost_usd=round(cost, 6),
+        )
+
+    # ——————————————————————————
+    # Registro de resultados
+    # ——————————————————————————
+
+    def record_outcome(
+        self,
+        decision: RouteDecision,
+        latency_seconds: float,
+        success: bool,
+        error: Optional[str] = None,
+    ) -> None:
+        key = (decision.stage, decision.model)
+        now = self._clock()
+        with self._lock:
+            previous = self._current_ema(key, now)
+            self._latency_ema[key] = (
+                latency_seconds
+                if previous is None
+                else previous + _LATENCY_EMA_ALPHA * (latency_seconds - previous)
+            )
+            self._latency_updated_at[key] = now
+            counts = self._outcomes.setdefault(key, {"success": 0, "error": 0})
+            counts["success" if success else "error"] += 1
+
+        if self.log_path:
+            entry = asdict(decision)
+            entry.update(
+                {
+                    "latency_seconds": round(latency_seconds, 3),
+                    "success": success,
+                    "error": error,
+                    "timestamp": datetime.now().isoformat(),
+                }
+            )
+            self._enqueue_log(json.dumps(entry, ensure_ascii=False))
+
+    @contextmanager
+    def track(self, decision: RouteDecision) -> Iterator[RouteDecision]:
+        """
+        Mide la latencia del bloque y registra el resultado de la decisión.
+        """
+        start = time.perf_counter()
+        try:
+            yield decision
+        except BaseException as e:
+            self.record_outcome(decision, time.perf_counter() - start, False, error=str(e))
+            raise
+        self.record_outcome(decision, time.perf_counter() - start, True)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "stage": stage,
+                    "model": model,
+                    "latency_ema_seconds": round(self._latency_ema[(stage, model)], 3),
+                    **self._outcomes.get((stage, model), {}),
+                }
+                for stage, model in self._latency_ema
+            ]
+
+    # ——————————————————————————
+    # Estimaciones internas
+    # ——————————————————————————
+
+    def _current_ema(self, key: tuple, now: float) -> Optional[float]:
+        """
+        Media de latencia vigente; None si no hay medidas o han caducado.
+        Llamar con el lock tomado.
+        """
+        updated_at = self._latency_updated_at.get(key)
+        if updated_at is None or now - updated_at > self.latency_ttl_seconds:
+            return None
+        return self._latency_ema[key]
+
+    def _observed_latency(self, stage: str, model: str) -> float:
+        with self._lock:
+            latency = self._current_ema((stage, model), self._clock())
+        return latency or 0.0
+
+    # ——————————————————————————
+    # Escritura del log de decisiones
+    # ——————————————————————————
+
+    def _enqueue_log(self, line: str) -> None:
+        if self._log_writer is None:
+            with self._lock:
+                if self._log_writer is None:
+                    self._log_writer = threading.Thread(
+                        target=self._write_log_lines, name="routing-log", daemon=True
+                    )
+                    self._log_writer.start()
+                    atexit.register(self.close)
+        self._log_queue.put(line)
+
+    def _write_log_lines(self) -> None:
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        while True:
+            line = self._log_queue.get()
+            if line is None:
+                return
+            lines = [line]
+            # Agrupar lo que ya esté en cola en una sola escritura
+            while True:
+                try:
+                    pending = self._log_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self._log_queue.put(None)
+                    break
+                lines.append(pending)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("".join(l + "\n" for l in lines))
+
+    def close(self) -> None:
+        """
+        Vacía el log pendiente y detiene el hilo escritor.
+        """
+        writer = self._log_writer
+        if writer is not None and writer.is_alive():
+            self._log_queue.put(None)
+            writer.join(timeout=5)
+
+    @staticmethod
+    def _estimate_cost(stage: str, model: str, conversation_chars: int) -> float:
+        pricing = MODEL_PRICING.get(model)
+        if pricing is None:
+            return 0.0
+        # ~4 caracteres por token; se suma el prompt fijo de cada etapa
+        input_tokens = conversation_chars / 4 + 500
+        output_tokens = STAGE_OUTPUT_TOKENS[stage]
+        per_call = (input_tokens * pricing["input"] + output_tokens * pricing["output"]) / 1_000_000
+        return per_call * STAGE_CALL_FACTOR[stage]
+
+
+# Instancia única global
+model_router = ModelRouter.from_settings()
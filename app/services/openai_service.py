@@ -2,17 +2,42 @@
 
 import asyncio
 import json
-from typing import List, AsyncGenerator, Dict, Any
+import logging
+from typing import List, AsyncGenerator, Dict, Any, Optional
 
 import openai
 from openai import OpenAI, AssistantEventHandler
 
 from app.models import ChatMessage
 from app.config import settings
+from app.services.resilience import get_upstream
 
-# 1) Configurar la clave para ChatCompletion (gpt-3.5-turbo) y para Assistants API
+logger = logging.getLogger(__name__)
+
+
+def _is_transient_openai_error(error: Exception) -> bool:
+    """Errores de OpenAI que indican un problema del servicio, no de la petición."""
+    return isinstance(
+        error,
+        (
+            openai.APIConnectionError,  # incluye APITimeoutError
+            openai.RateLimitError,
+            openai.InternalServerError,
+        ),
+    )
+
+
+# 1) Configurar la clave para ChatCompletion (gpt-3.5-turbo) y para Assistants API.
+# Los reintentos y plazos los gestiona la capa de resiliencia, no el SDK.
 openai.api_key = settings.openai_api_key
-client = OpenAI(api_key=settings.openai_api_key)
+openai.max_retries = 0
+client = OpenAI(
+    api_key=settings.openai_api_key,
+    max_retries=0,
+    timeout=settings.resilience_timeouts["openai_stream"],
+)
+openai_upstream = get_upstream("openai", is_retryable=_is_transient_openai_error)
+openai_stream_upstream = get_upstream("openai_stream", is_retryable=_is_transient_openai_error)
 
 
 class _StreamHandler(AssistantEventHandler):
@@ -21,16 +46,18 @@ class _StreamHandler(AssistantEventHandler):
     Cada vez que llega un fragmento de texto (textDelta), lo ponemos en la cola.
     """
 
-    def __init__(self, queue: asyncio.Queue):
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
         super().__init__()
         self._queue = queue
+        self._loop = loop
 
     def on_text_delta(self, delta, snapshot):
         """
         Se llama cada vez que llega un fragmento de texto.
         `delta.value` contiene la parte nueva de texto del assistant.
         """
-        self._queue.put_nowait(delta.value)
+        # El handler corre en el hilo del executor: la cola es del event loop
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, delta.value)
 
     def on_text_created(self, text):
         """
@@ -48,10 +75,13 @@ async def stream_chat(
     """
     Llama a la Assistants API en modo streaming y devuelve un AsyncGenerator
     que emite {'role': 'assistant', 'delta': 'fragmento_de_texto'}.
+    Si la llamada falla, el error se registra y se relanza al consumidor
+    en lugar de cerrar el stream como si hubiera terminado bien.
     """
 
     # 1) Creamos un asyncio.Queue para comunicar el thread de streaming con este async generator
     queue: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
 
     # 2) Construir el array de mensajes históricos (sin incluir 'system')
     user_and_assistant_msgs = [
@@ -60,35 +90,41 @@ async def stream_chat(
 
     # 3) Función síncrona que crea Thread + Mensajes + Run en streaming
     def _run_stream():
-        # 3.1) Crear un nuevo Thread para esta conversación
-        thread = client.beta.threads.create()
-
-        # 3.2) Añadir al Thread todos los mensajes previos de la conversación
-        for m in user_and_assistant_msgs:
-            client.beta.threads.messages.create(
-                thread_id=thread.id,
-                role=m["role"],
-                content=m["content"]
-            )
-
-        # 3.3) Instanciar el handler que pone cada delta en la cola
-        handler = _StreamHandler(queue)
-
-        # 3.4) Ejecutar el Asistente en streaming. Pasamos system_prompt como instructions.
-        with client.beta.threads.runs.stream(
-            thread_id=thread.id,
-            assistant_id=assistant_id,
-            instructions=settings.system_prompt,
-            temperature=temperature,
-            event_handler=handler
-        ) as stream_obj:
-            stream_obj.until_done()
-
-        # 3.5) Cuando el streaming termina, ponemos un sentinel `None` para cerrar el generator
-        queue.put_nowait(None)
+        try:
+            # 3.1) Crear un nuevo Thread para esta conversación
+            thread = openai_upstream.call(client.beta.threads.create)
+
+            # 3.2) Añadir al Thread todos los mensajes previos de la conversación
+            for m in user_and_assistant_msgs:
+                openai_upstream.call(
+                    client.beta.threads.messages.create,
+                    thread_id=thread.id,
+                    role=m["role"],
+                    content=m["content"],
+                )
+
+            # 3.3) Instanciar el handler que pone cada delta en la cola
+            handler = _StreamHandler(queue, loop)
+
+            # 3.4) Ejecutar el Asistente en streaming. Pasamos system_prompt como instructions.
+            # Un streaming ya iniciado no se reintenta: solo breaker y plazo del cliente.
+            with openai_stream_upstream.guard():
+                with client.beta.threads.runs.stream(
+                    thread_id=thread.id,
+                    assistant_id=assistant_id,
+                    instructions=settings.system_prompt,
+                    temperature=temperature,
+                    event_handler=handler
+                ) as stream_obj:
+                    stream_obj.until_done()
+        except Exception as e:
+            # 3.5) El error viaja por la cola para que el generator lo relance
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            # 3.6) Pase lo que pase, ponemos un sentinel `None` para cerrar el generator
+            loop.call_soon_threadsafe(queue.put_nowait, None)
 
     # 4) Ejecutamos `_run_stream` en un ThreadPoolExecutor para no bloquear el event loop
-    loop = asyncio.get_event_loop()
     from concurrent.futures import ThreadPoolExecutor
 
     executor = ThreadPoolExecutor(max_workers=1)
@@ -100,17 +136,24 @@ async def stream_chat(
         if item is None:
             # Llegó el sentinel: streaming completado
             break
+        if isinstance(item, Exception):
+            logger.error(f"Error en el streaming de la respuesta: {item!r}")
+            raise item
         yield {"role": "assistant", "delta": item}
 
 
 async def summarize_conversation(
     messages: List[ChatMessage],
     assistant_id: str = settings.openai_assistant_id,
+    model: str = settings.model_default,
     temperature: float = 0.2,
     max_tokens: int = 1000,
+    previous_summary: str = "",
 ) -> str:
     """
     Genera un resumen de toda la conversación usando la Assistants API en modo no‐streaming.
+    Si se pasa previous_summary, `messages` son solo los mensajes nuevos y se
+    devuelve el resumen anterior actualizado con ellos (resumen incremental).
     Devuelve el texto completo de la respuesta.
     """
 
@@ -120,17 +163,30 @@ async def summarize_conversation(
         prefix = "Usuario:" if msg.role == "user" else "Asistente:"
         transcript += f"{prefix} {msg.content}\n"
 
-    prompt = (
-        "Por favor, resume esta conversación enfocándote en los insights clave "
-        "sobre el lead (motivaciones, necesidades, objeciones, datos de contacto, etc.).\n\n"
-        + transcript
-        + "\n\nResumen:"
-    )
+    if previous_summary:
+        prompt = (
+            "Este es el resumen de la conversación con el lead hasta ahora:\n\n"
+            + previous_summary
+            + "\n\nActualízalo incorporando los siguientes mensajes nuevos, manteniendo "
+            "el foco en los insights clave (motivaciones, necesidades, objeciones, datos de contacto, etc.).\n\n"
+            + transcript
+            + "\n\nResumen actualizado:"
+        )
+    else:
+        prompt = (
+            "Por favor, resume esta conversación enfocándote en los insights clave "
+            "sobre el lead (motivaciones, necesidades, objeciones, datos de contacto, etc.).\n\n"
+            + transcript
+            + "\n\nResumen:"
+        )
 
     # 2) Para no‐streaming, usamos el helper runs.create
     def _run_summarize():
-        resp = openai.chat.completions.create(
-            model="gpt-4.1-mini",
+        resp = openai_upstream.call(
+            openai.chat.completions.create,
+            idempotent=True,
+            timeout=openai_upstream.policy.timeout_seconds,
+            model=model,
             messages=[
                 {"role": "system", "content":"Eres un experto resumiendo conversaciones donde es importante captar los insights clave sobre el lead (motivaciones, necesidades, objeciones, datos de contacto, etc.)."},
                 {"role": "user", "content": prompt},
@@ -151,37 +207,53 @@ async def summarize_conversation(
 
 async def extract_lead_data(
     full_conversation: str,
-    model: str = "gpt-4.1-mini",
+    model: str = settings.model_default,
     temperature: float = 0.0,
     max_tokens: int = 1000,
+    previous_data: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
-    Extrae datos estructurados (nombre, empresa, necesidad, presupuesto, urgencia, tono)
+    Extrae datos estructurados (nombre, empresa, sector, tamano_empresa, necesidad, presupuesto, urgencia, tono)
     de la conversación completa usando openai.ChatCompletion.create con gpt-3.5-turbo.
+    Si se pasa previous_data, `full_conversation` es solo el fragmento nuevo y el
+    modelo completa/corrige los datos ya extraídos (extracción incremental).
     Devuelve un dict con esas claves.
     """
 
+    previous_block = ""
+    if previous_data:
+        previous_block = f"""
+Datos ya extraídos de la parte anterior de la conversación (mantenlos salvo que
+el fragmento nuevo los complete o los corrija):
+{json.dumps(previous_data, ensure_ascii=False)}
+"""
+
     # 1) Construir el prompt instructivo para extraer JSON
     extraction_prompt = f"""
 Extrae los siguientes datos del lead basándote en esta conversación. Devuelve únicamente un JSON:
 
 - Nombre del lead (si se menciona; sino "" )
 - Empresa (si se menciona; sino "" )
+- Sector o industria de la empresa (si se menciona; sino "" )
+- Tamaño de la empresa (por ejemplo: "120 empleados", "pyme", o vacío "")
 - Necesidad expresada por el lead
 - Presupuesto estimado (por ejemplo: "5000€", o vacío "")
 - Urgencia ("alta", "media", "baja", o "")
 - Tono de la conversación ("positivo", "dudoso", "negativo", o "")
-
+{previous_block}
 Conversación:
 \"\"\"
 {full_conversation}
 \"\"\"
 
-JSON con claves: nombre, empresa, necesidad, presupuesto, urgencia, tono.
+JSON con claves: nombre, empresa, sector, tamano_empresa, necesidad, presupuesto, urgencia, tono.
 """
     # 2) Llamada síncrona en executor para no bloquear
     def _run_extract():
-        resp = openai.chat.completions.create(
+        resp = openai_upstream.call(
+            openai.chat.completions.create,
+            idempotent=True,
+            timeout=openai_upstream.policy.timeout_seconds,
             model=model,
             messages=[
                 {"role": "system", "content": settings.prompt_extract_info},
@@ -198,6 +270,8 @@ JSON con claves: nombre, empresa, necesidad, presupuesto, urgencia, tono.
             return {
                 "nombre": "",
                 "empresa": "",
+                "sector": "",
+                "tamano_empresa": "",
                 "necesidad": text,
                 "presupuesto": "",
                 "urgencia": "",
@@ -224,17 +298,30 @@ class OpenAIService:
     async def summarize_conversation(
         messages: List[ChatMessage],
         assistant_id: str = settings.openai_assistant_id,
+        model: str = settings.model_default,
         temperature: float = 0.3,
         max_tokens: int = 300,
+        previous_summary: str = "",
     ) -> str:
         return await summarize_conversation(
-            messages, assistant_id=assistant_id, temperature=temperature, max_tokens=max_tokens
+            messages,
+            assistant_id=assistant_id,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            previous_summary=previous_summary,
         )
 
     @staticmethod
     async def extract_lead_data(
         full_conversation: str,
-        model: str = "gpt-4.1-mini",
+        model: str = settings.model_default,
         temperature: float = 0.0,
+        previous_data: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        return await extract_lead_data(full_conversation, model=model, temperature=temperature)
+        return await extract_lead_data(
+            full_conversation,
+            model=model,
+            temperature=temperature,
+            previous_data=previous_data,
+        )
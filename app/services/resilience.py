@@ -0,0 +1,385 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.config import settings
+
+
+class UpstreamError(Exception):
+    """Error base de la capa de resiliencia."""
+
+
+class TransientUpstreamError(UpstreamError):
+    """
+    El upstream rechazó la petición sin procesarla (429, 503...). Siempre es
+    seguro reintentarla, aunque la llamada no sea idempotente.
+    """
+
+
+class DeadlineExceeded(UpstreamError):
+    """La llamada no terminó dentro del plazo del upstream."""
+
+
+class CircuitOpenError(UpstreamError):
+    """El circuito está abierto: se falla rápido sin llamar al upstream."""
+
+
+@dataclass
+class UpstreamPolicy:
+    """
+    Política de resiliencia de un upstream.
+    - timeout_seconds: plazo total de la llamada, reintentos incluidos.
+    - hedge_percentile: si se indica, las llamadas idempotentes lanzan una
+      segunda petición cuando la primera supera ese percentil de latencia.
+    - Solo se reintentan las llamadas idempotentes, salvo que el error sea
+      TransientUpstreamError.
+    """
+    name: str
+    timeout_seconds: float
+    max_attempts: int = 3
+    backoff_base_seconds: float = 0.2
+    backoff_max_seconds: float = 2.0
+    hedge_percentile: Optional[float] = None
+    hedge_min_samples: int = 20
+    # Decide si un error refleja un problema del upstream (reintentable y
+    # contabilizado por el breaker) o de la propia petición (p. ej. un 400)
+    is_retryable: Callable[[Exception], bool] = lambda e: True
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos: cada llamada aporta `ratio` fichas y cada
+    reintento gasta una. Evita que los reintentos multipliquen la carga
+    sobre un upstream que ya está caído.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    Circuito clásico de tres estados:
+    - closed: pasa todo; tras `failure_threshold` fallos seguidos se abre.
+    - open: falla rápido durante `reset_timeout_seconds`.
+    - half_open: deja pasar una única llamada de prueba que decide si se
+      cierra de nuevo o vuelve a abrirse.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias para calcular percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class Upstream:
+    """
+    Ejecuta llamadas síncronas a un upstream aplicando plazo, reintentos con
+    jitter (limitados por el presupuesto), circuit breaker y, para llamadas
+    idempotentes, peticiones de cobertura (hedging).
+
+    Cada intento corre en el executor compartido, así que el llamante deja
+    de esperar al vencer el plazo aunque el cliente HTTP subyacente no
+    tenga timeout propio.
+    """
+
+    def __init__(
+        self,
+        policy: UpstreamPolicy,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.policy = policy
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.budget = budget or RetryBudget()
+        self.latency = LatencyTracker()
+        self._executor = executor or _shared_executor()
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng
+
+    def call(self, fn: Callable[..., Any], *args: Any, idempotent: bool = False, **kwargs: Any) -> Any:
+        deadline = self._clock() + self.policy.timeout_seconds
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuito abierto para {self.policy.name}")
+            try:
+                result = self._attempt(fn, args, kwargs, deadline, hedge=idempotent)
+            except Exception as e:
+                transient = isinstance(e, TransientUpstreamError)
+                if not (transient or isinstance(e, DeadlineExceeded) or self.policy.is_retryable(e)):
+                    # El upstream respondió: el error es de la petición, no de su salud
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if (
+                    not (idempotent or transient)
+                    or isinstance(e, DeadlineExceeded)
+                    or attempt >= self.policy.max_attempts
+                    or not self.budget.try_withdraw()
+                ):
+                    raise
+                # Backoff exponencial con jitter completo, sin pasarse del plazo
+                backoff = min(
+                    self.policy.backoff_max_seconds,
+                    self.policy.backoff_base_seconds * (2 ** (attempt - 1)),
+                ) * self._rng()
+                if self._clock() + backoff >= deadline:
+                    raise
+                self._sleep(backoff)
+                continue
+            self.breaker.record_success()
+            return result
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Solo circuit breaker, para llamadas que no se pueden repetir ni
+        delegar en otro hilo (p. ej. un streaming ya en curso).
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuito abierto para {self.policy.name}")
+        try:
+            yield
+        except Exception as e:
+            if isinstance(e, UpstreamError) or self.policy.is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+
+    def _attempt(self, fn, args, kwargs, deadline: float, hedge: bool) -> Any:
+        start = self._clock()
+        futures = [self._executor.submit(fn, *args, **kwargs)]
+
+        hedge_after = self._hedge_delay() if hedge else None
+        if hedge_after is not None and start + hedge_after < deadline:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                futures.append(self._executor.submit(fn, *args, **kwargs))
+
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self.latency.record(self._clock() - start)
+                    return future.result()
+                error = future.exception()
+
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise DeadlineExceeded(
+                f"{self.policy.name} superó el plazo de {self.policy.timeout_seconds}s"
+            )
+        raise error
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.policy.hedge_percentile is None or len(self.latency) < self.policy.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.policy.hedge_percentile)
+
+
+class FaultInjector:
+    """
+    Stand-in local para probar la capa sin upstreams reales: envuelve una
+    función e inyecta latencia y errores con las probabilidades indicadas.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[..., Any],
+        error_rate: float = 0.0,
+        latency_seconds: float = 0.0,
+        slow_rate: float = 0.0,
+        error: Callable[[], Exception] = lambda: TransientUpstreamError("fallo inyectado"),
+        rng: Callable[[], float] = random.random,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.fn = fn
+        self.error_rate = error_rate
+        self.latency_seconds = latency_seconds
+        self.slow_rate = slow_rate
+        self.error = error
+        self.rng = rng
+        self.sleep = sleep
+        self.calls = 0
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        self.calls += 1
+        if self.rng() < self.slow_rate:
+            self.sleep(self.latency_seconds)
+        if self.rng() < self.error_rate:
+            raise self.error()
+        return self.fn(*args, **kwargs)
+
+
+# ——————————————————————————
+# Registro de upstreams compartidos
+# ——————————————————————————
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.resilience_max_workers,
+                thread_name_prefix="upstream",
+            )
+        return _executor
+
+
+def build_upstream(
+    name: str,
+    is_retryable: Optional[Callable[[Exception], bool]] = None,
+) -> Upstream:
+    """
+    Crea un upstream (sin registrarlo) con la política de settings. `name`
+    puede llevar un sufijo "tipo:clave" (p. ej. "scrape:example.com"): la
+    configuración se toma del tipo y el breaker es propio de la clave.
+    """
+    kind = name.split(":", 1)[0]
+    policy = UpstreamPolicy(
+        name=name,
+        timeout_seconds=settings.resilience_timeouts.get(kind, 30.0),
+        max_attempts=settings.resilience_max_attempts,
+        hedge_percentile=settings.resilience_hedge_percentiles.get(kind),
+    )
+    if is_retryable is not None:
+        policy.is_retryable = is_retryable
+    return Upstream(
+        policy,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.resilience_breaker_failure_threshold,
+            reset_timeout_seconds=settings.resilience_breaker_reset_seconds,
+        ),
+        budget=RetryBudget(ratio=settings.resilience_retry_budget_ratio),
+    )
+
+
+def get_upstream(
+    name: str,
+    is_retryable: Optional[Callable[[Exception], bool]] = None,
+) -> Upstream:
+    """
+    Devuelve (creándolo la primera vez) el upstream configurado en settings.
+    `is_retryable` solo se tiene en cuenta al crearlo.
+    """
+    with _upstreams_lock:
+        upstream = _upstreams.get(name)
+        if upstream is None:
+            upstream = build_upstream(name, is_retryable)
+            _upstreams[name] = upstream
+        return upstream
@@ -0,0 +1,165 @@
+import socket
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from crewai_tools import ScrapeWebsiteTool, SerperDevTool
+
+from app.services.resilience import Upstream, build_upstream, get_upstream
+
+# Máximo de hosts con breaker propio para el scraping (LRU)
+_MAX_SCRAPE_HOSTS = 256
+
+# ——————————————————————————
+# Timeout real en los sockets de las herramientas
+# ——————————————————————————
+
+# Las herramientas de crewai_tools llaman a requests sin timeout (o con uno
+# fijo). El plazo del upstream deja de esperar, pero no puede parar el hilo;
+# sin timeout de socket el worker se quedaría colgado en el executor.
+# Mientras dure alguna llamada de estas herramientas, Session.request se
+# sustituye por una versión que aplica el timeout del hilo a las peticiones
+# que no traen uno propio; al terminar la última se restaura el original.
+# Las peticiones de otros hilos pasan intactas porque no tienen timeout local.
+_local = threading.local()
+_patch_lock = threading.Lock()
+_patch_users = 0
+_original_request: Optional[Callable[..., Any]] = None
+
+
+def _request_with_thread_timeout(self, method, url, **kwargs):
+    timeout = getattr(_local, "timeout", None)
+    if timeout is not None and kwargs.get("timeout") is None:
+        kwargs["timeout"] = timeout
+    return _original_request(self, method, url, **kwargs)
+
+
+@contextmanager
+def socket_timeout(timeout: float) -> Iterator[None]:
+    """
+    Aplica `timeout` a las peticiones de requests hechas desde este hilo
+    dentro del bloque.
+    """
+    global _patch_users, _original_request
+    with _patch_lock:
+        if _patch_users == 0:
+            _original_request = requests.Session.request
+            requests.Session.request = _request_with_thread_timeout
+        _patch_users += 1
+    previous = getattr(_local, "timeout", None)
+    _local.timeout = timeout
+    try:
+        yield
+    finally:
+        _local.timeout = previous
+        with _patch_lock:
+            _patch_users -= 1
+            if _patch_users == 0:
+                requests.Session.request = _original_request
+
+
+def _with_socket_timeout(fn: Callable[..., Any], timeout: float) -> Callable[..., Any]:
+    # El upstream puede ejecutar `fn` en otro hilo (plazo, hedging): el
+    # timeout se fija dentro de la llamada, en el hilo que hace la petición
+    def _call(**kwargs: Any) -> Any:
+        with socket_timeout(timeout):
+            return fn(**kwargs)
+    return _call
+
+
+# ——————————————————————————
+# Qué errores cuentan como fallo del upstream
+# ——————————————————————————
+
+def _error_chain(error: BaseException):
+    """
+    Recorre la cadena de causas (requests → urllib3 → socket).
+    """
+    seen = set()
+    pending = [error]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        yield current
+        pending.extend([current.__cause__, current.__context__, getattr(current, "reason", None)])
+        pending.extend(arg for arg in current.args if isinstance(arg, BaseException))
+
+
+def _is_name_resolution_error(error: BaseException) -> bool:
+    return any(
+        isinstance(e, socket.gaierror) or type(e).__name__ == "NameResolutionError"
+        for e in _error_chain(error)
+    )
+
+
+def is_retryable_scrape_error(error: Exception) -> bool:
+    """
+    Solo los timeouts y errores de conexión son reintentables. Un dominio que
+    no resuelve o una respuesta HTTP de error no mejoran reintentando.
+    """
+    if isinstance(error, requests.Timeout):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        return not _is_name_resolution_error(error)
+    return False
+
+
+def is_retryable_serper_error(error: Exception) -> bool:
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+# ——————————————————————————
+# Upstreams
+# ——————————————————————————
+
+_scrape_upstreams: "OrderedDict[str, Upstream]" = OrderedDict()
+_scrape_lock = threading.Lock()
+
+
+def scrape_upstream(url: Optional[str]) -> Upstream:
+    """
+    Un upstream (y por tanto un circuit breaker) por host: unas cuantas URLs
+    muertas de un sitio no deben cortar el scraping del resto.
+    """
+    host = (urlparse(url or "").hostname or "").lower()
+    with _scrape_lock:
+        upstream = _scrape_upstreams.get(host)
+        if upstream is None:
+            upstream = build_upstream(f"scrape:{host}", is_retryable=is_retryable_scrape_error)
+            _scrape_upstreams[host] = upstream
+            if len(_scrape_upstreams) > _MAX_SCRAPE_HOSTS:
+                _scrape_upstreams.popitem(last=False)
+        _scrape_upstreams.move_to_end(host)
+        return upstream
+
+
+class ResilientSerperDevTool(SerperDevTool):
+    """SerperDevTool con plazo, reintentos, circuit breaker y hedging."""
+
+    def _run(self, **kwargs: Any) -> Any:
+        upstream = get_upstream("serper", is_retryable=is_retryable_serper_error)
+        run = _with_socket_timeout(super()._run, upstream.policy.timeout_seconds)
+        return upstream.call(run, idempotent=True, **kwargs)
+
+
+class ResilientScrapeWebsiteTool(ScrapeWebsiteTool):
+    """ScrapeWebsiteTool con plazo, reintentos, circuit breaker por host y hedging."""
+
+    def _run(self, **kwargs: Any) -> Any:
+        upstream = scrape_upstream(kwargs.get("website_url") or getattr(self, "website_url", None))
+        run = _with_socket_timeout(super()._run, upstream.policy.timeout_seconds)
+        return upstream.call(run, idempotent=True, **kwargs)
+
+
+def resilient_tools() -> List[Any]:
+    """
+    Herramientas de búsqueda y scraping para los agentes del crew.
+    """
+    return [ResilientSerperDevTool(), ResilientScrapeWebsiteTool()]
@@ -0,0 +1,303 @@
+import asyncio
+import itertools
+import math
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.admission_service import AdmissionRejected
+from app.services.analytics_service import parse_budget
+from app.services.resilience import LatencyTracker
+
+# Carriles de scoring, ordenados de mayor a menor prioridad
+HOT = "hot"
+WARM = "warm"
+COLD = "cold"
+LANES = (HOT, WARM, COLD)
+
+# Tamaños orientativos cuando la empresa se describe sin cifra
+_COMPANY_SIZE_WORDS = (
+    ("multinacional", 5000),
+    ("grande", 1000),
+    ("mediana", 100),
+    ("pyme", 20),
+    ("pequeña", 10),
+    ("startup", 10),
+    ("autónomo", 1),
+    ("freelance", 1),
+)
+
+
+def parse_company_size(value: Any) -> float:
+    """
+    Convierte el tamaño de empresa extraído ("120 empleados", "50-200",
+    "pyme", "multinacional") en un número aproximado de empleados.
+    Devuelve NaN si no hay información.
+    """
+    size = parse_budget(value)
+    if not math.isnan(size):
+        return size
+    text = str(value or "").strip().lower()
+    for word, employees in _COMPANY_SIZE_WORDS:
+        if re.search(rf"\b{word}", text):
+            return float(employees)
+    return math.nan
+
+
+def classify_lead(extracted_data: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Decide el carril de scoring a partir de las señales de intención de la
+    extracción (urgencia, presupuesto y tamaño de empresa). Cada señal suma
+    0-2 puntos; con 4 o más el lead es "hot", con 2-3 "warm" y si no "cold".
+    Devuelve el carril y las señales usadas, para métricas y logs.
+    """
+    data = extracted_data or {}
+    urgency = str(data.get("urgencia") or "").strip().lower()
+    budget = parse_budget(data.get("presupuesto"))
+    company_size = parse_company_size(data.get("tamano_empresa"))
+
+    points = {"alta": 2, "media": 1}.get(urgency, 0)
+    if budget >= settings.scoring_budget_hot:
+        points += 2
+    elif budget >= settings.scoring_budget_warm:
+        points += 1
+    if company_size >= settings.scoring_company_size_hot:
+        points += 2
+    elif company_size >= settings.scoring_company_size_warm:
+        points += 1
+
+    lane = HOT if points >= 4 else WARM if points >= 2 else COLD
+    signals = {
+        "urgency": urgency,
+        "budget": None if math.isnan(budget) else budget,
+        "company_size": None if math.isnan(company_size) else company_size,
+        "points": points,
+    }
+    return lane, signals
+
+
+class _Waiter:
+    __slots__ = ("future", "lane", "user_key", "enqueued_at", "seq")
+
+    def __init__(
+        self, future: asyncio.Future, lane: str, user_key: str, enqueued_at: float, seq: int
+    ):
+        self.future = future
+        self.lane = lane
+        self.user_key = user_key
+        self.enqueued_at = enqueued_at
+        self.seq = seq
+
+
+class ScoringScheduler:
+    """
+    Planificador de las ejecuciones del crew de scoring.
+
+    - Un límite global de crews simultáneos y otro por carril, para que los
+      leads fríos no ocupen toda la capacidad mientras haya leads de un
+      carril más prioritario esperando. Si no los hay, un carril puede usar
+      la capacidad global libre por encima de su límite.
+    - Al quedar un hueco se atiende al waiter de mejor prioridad efectiva:
+      la del carril menos un nivel por cada `aging_seconds` de espera, así
+      que un lead frío acaba adelantando a los calientes que llegan después
+      y nunca se queda esperando indefinidamente.
+    - Colas acotadas por carril, espera máxima y un límite de crews en cola
+      o en curso por usuario; al superarlos se rechaza con AdmissionRejected
+      (429 con Retry-After), igual que en la admisión.
+    - Métricas de espera en cola por carril (p50/p95/máximo).
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        lane_limits: Dict[str, int],
+        aging_seconds: float,
+        max_waiting: Dict[str, int],
+        max_wait_seconds: float,
+        per_user_limit: int,
+        retry_after_seconds: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.concurrency = concurrency
+        self.lane_limits = {lane: lane_limits.get(lane, concurrency) for lane in LANES}
+        self.aging_seconds = aging_seconds
+        self.max_waiting = {lane: max_waiting.get(lane, concurrency) for lane in LANES}
+        self.max_wait_seconds = max_wait_seconds
+        self.per_user_limit = per_user_limit
+        self.retry_after_seconds = retry_after_seconds
+        self._clock = clock
+
+        self._seq = itertools.count()
+        self._active_total = 0
+        self._active_lane: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._waiters: List[_Waiter] = []
+        # Crews en cola o en curso por usuario
+        self._user_runs: Dict[str, int] = {}
+        self._rejected: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._completed: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._cancelled: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._promoted: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._wait_times: Dict[str, LatencyTracker] = {lane: LatencyTracker() for lane in LANES}
+
+    @classmethod
+    def from_settings(cls) -> "ScoringScheduler":
+        return cls(
+            concurrency=settings.scoring_concurrency,
+            lane_limits=settings.scoring_lane_limits,
+            aging_seconds=settings.scoring_aging_seconds,
+            max_waiting=settings.scoring_max_waiting,
+            max_wait_seconds=settings.scoring_max_wait_seconds,
+            per_user_limit=settings.scoring_per_user_limit,
+            retry_after_seconds=settings.scoring_retry_after_seconds,
+        )
+
+    # ——————————————————————————
+    # API pública
+    # ——————————————————————————
+
+    async def acquire(self, lane: str, user_key: str) -> float:
+        """
+        Espera turno en el carril indicado y devuelve los segundos de espera.
+        Lanza AdmissionRejected si el usuario ya tiene `per_user_limit` crews
+        en cola o en curso, si la cola del carril está llena o si se agota
+        `max_wait_seconds`.
+        """
+        if lane not in self.lane_limits:
+            raise ValueError(f"Carril de scoring desconocido: {lane}")
+        if self._user_runs.get(user_key, 0) >= self.per_user_limit:
+            self._reject(lane, "demasiados scorings del usuario")
+        if sum(1 for w in self._waiters if w.lane == lane) >= self.max_waiting[lane]:
+            self._reject(lane, "cola de espera llena")
+
+        waiter = _Waiter(
+            asyncio.get_running_loop().create_future(),
+            lane,
+            user_key,
+            self._clock(),
+            next(self._seq),
+        )
+        self._user_runs[user_key] = self._user_runs.get(user_key, 0) + 1
+        self._waiters.append(waiter)
+        self._dispatch()
+        if waiter.future.done():
+            return waiter.future.result()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Se concedió justo al expirar: aprovechamos el hueco
+                return waiter.future.result()
+            self._waiters.remove(waiter)
+            self._user_done(user_key)
+            self._reject(lane, "tiempo de espera agotado")
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba; si ya teníamos hueco, lo devolvemos
+            self._cancelled[lane] += 1
+            if waiter.future.done():
+                self._free_slot(lane)
+            else:
+                self._waiters.remove(waiter)
+            self._user_done(user_key)
+            raise
+        return waiter.future.result()
+
+    def release(self, lane: str, user_key: str) -> None:
+        """
+        Devuelve el hueco de un crew terminado (con éxito o con error).
+        """
+        self._completed[lane] += 1
+        self._user_done(user_key)
+        self._free_slot(lane)
+
+    @asynccontextmanager
+    async def slot(self, lane: str, user_key: str) -> AsyncIterator[float]:
+        waited = await self.acquire(lane, user_key)
+        try:
+            yield waited
+        finally:
+            self.release(lane, user_key)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = self._clock()
+        result = {}
+        for lane in LANES:
+            waiting = [w for w in self._waiters if w.lane == lane]
+            wait_times = self._wait_times[lane]
+            result[lane] = {
+                "active": self._active_lane[lane],
+                "limit": self.lane_limits[lane],
+                "waiting": len(waiting),
+                "oldest_wait_seconds": max((now - w.enqueued_at for w in waiting), default=0.0),
+                "completed": self._completed[lane],
+                "cancelled": self._cancelled[lane],
+                "rejected": self._rejected[lane],
+                "promoted": self._promoted[lane],
+                "wait_p50_seconds": wait_times.percentile(50),
+                "wait_p95_seconds": wait_times.percentile(95),
+                "wait_max_seconds": wait_times.percentile(100),
+            }
+        return result
+
+    # ——————————————————————————
+    # Lógica interna
+    # ——————————————————————————
+
+    def _priority(self, waiter: _Waiter, now: float) -> Tuple[float, int]:
+        rank = LANES.index(waiter.lane)
+        if self.aging_seconds > 0:
+            rank -= (now - waiter.enqueued_at) / self.aging_seconds
+        return rank, waiter.seq
+
+    def _reject(self, lane: str, reason: str) -> None:
+        self._rejected[lane] += 1
+        raise AdmissionRejected(lane, self.retry_after_seconds, reason)
+
+    def _user_done(self, user_key: str) -> None:
+        remaining = self._user_runs.get(user_key, 0) - 1
+        if remaining > 0:
+            self._user_runs[user_key] = remaining
+        else:
+            self._user_runs.pop(user_key, None)
+
+    def _free_slot(self, lane: str) -> None:
+        self._active_total -= 1
+        self._active_lane[lane] -= 1
+        self._dispatch()
+
+    def _can_start(self, lane: str) -> bool:
+        if self._active_lane[lane] < self.lane_limits[lane]:
+            return True
+        # Por encima de su límite solo si no espera nadie de un carril más
+        # prioritario que pueda usar el hueco
+        rank = LANES.index(lane)
+        return not any(
+            LANES.index(w.lane) < rank and self._active_lane[w.lane] < self.lane_limits[w.lane]
+            for w in self._waiters
+        )
+
+    def _dispatch(self) -> None:
+        now = self._clock()
+        while self._active_total < self.concurrency:
+            eligible = [w for w in self._waiters if self._can_start(w.lane)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: self._priority(w, now))
+            self._waiters.remove(waiter)
+
+            # Adelantó por envejecimiento a alguien de un carril más prioritario
+            rank = LANES.index(waiter.lane)
+            if any(LANES.index(w.lane) < rank for w in eligible if w is not waiter):
+                self._promoted[waiter.lane] += 1
+
+            waited = now - waiter.enqueued_at
+            self._wait_times[waiter.lane].record(waited)
+            self._active_total += 1
+            self._active_lane[waiter.lane] += 1
+            waiter.future.set_result(waited)
+
+
+# Instancia única global
+scoring_scheduler = ScoringScheduler.from_settings()
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from app.config import settings
+from app.models import ChatMessage
+from app.services.admission_service import SCORING, admission_controller
+from app.services.model_router import (
+    STAGE_EXTRACTION,
+    STAGE_SUMMARY,
+    RouteDecision,
+    estimate_lead_quality,
+    model_router,
+)
+from app.services.openai_service import OpenAIService
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def _tracked(decision: RouteDecision, awaitable: Awaitable[T]) -> T:
+    """
+    Mide cada llamada por separado aunque se lancen en paralelo.
+    """
+    with model_router.track(decision):
+        return await awaitable
+
+
+def format_conversation(messages: List[ChatMessage]) -> str:
+    return "\n".join(
+        f"{'USER' if m.role == 'user' else 'ASSISTANT'}: {m.content}"
+        for m in messages
+    )
+
+
+def merge_extracted(previous: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combina dos extracciones: los campos no vacíos de la nueva prevalecen.
+    """
+    merged = dict(previous)
+    for key, value in new.items():
+        if value not in ("", None) or key not in merged:
+            merged[key] = value
+    return merged
+
+
+class SessionAnalysis:
+    """
+    Estado del análisis especulativo de una sesión de chat.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.processed: List[Tuple[str, str]] = []
+        self.extracted: Dict[str, Any] = {}
+        self.summary: str = ""
+        self.research: str = ""
+        self.research_company: str = ""
+        self.research_task: Optional[asyncio.Task] = None
+        self.update_task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+        self.touched_at = time.monotonic()
+
+
+class SpeculativeAnalyzer:
+    """
+    Adelanta el trabajo de /chat/finish mientras la conversación sigue viva.
+
+    Tras cada turno completo del asistente se actualizan en segundo plano,
+    solo con los mensajes nuevos, los datos extraídos del lead y un resumen
+    incremental. En cuanto se conoce la empresa se lanza una búsqueda previa
+    que luego aprovecha el crew. El trabajo es de baja prioridad: solo se
+    ejecuta si el carril de scoring tiene hueco inmediato; si no, se recupera
+    al finalizar.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        ttl_seconds: float,
+        finish_wait_seconds: float,
+        research_wait_seconds: float,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.finish_wait_seconds = finish_wait_seconds
+        self.research_wait_seconds = research_wait_seconds
+        self._sessions: "OrderedDict[str, SessionAnalysis]" = OrderedDict()
+        # Referencias fuertes a las tareas en curso para que no las recolecte el GC
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls) -> "SpeculativeAnalyzer":
+        return cls(
+            max_sessions=settings.speculative_max_sessions,
+            ttl_seconds=settings.speculative_session_ttl_seconds,
+            finish_wait_seconds=settings.speculative_finish_wait_seconds,
+            research_wait_seconds=settings.speculative_research_wait_seconds,
+        )
+
+    # ——————————————————————————
+    # API pública
+    # ——————————————————————————
+
+    def schedule(self, session_id: str, messages: List[ChatMessage], user_key: str) -> None:
+        """
+        Programa la actualización tras un turno completo del asistente.
+        Si ya hay una en curso para la sesión, la siguiente la alcanzará.
+        """
+        state = self._get_state(session_id)
+        if state.update_task and not state.update_task.done():
+            return
+        task = asyncio.create_task(self._background_update(state, list(messages), user_key))
+        state.update_task = task
+        self._track(task)
+
+    async def finalize(
+        self, session_id: str, messages: List[ChatMessage]
+    ) -> Optional[SessionAnalysis]:
+        """
+        Completa el análisis con los mensajes que falten y devuelve el estado
+        listo para el scoring, o None si no hay nada aprovechable. Si la
+        actualización en curso no termina en `finish_wait_seconds`, se
+        descarta el análisis y el cierre hace la extracción completa. La
+        investigación previa solo se espera `research_wait_seconds`: quien
+        llama tiene ocupado un hueco de scoring y el crew investiga igualmente.
+        """
+        state = self._sessions.get(session_id)
+        if state is None:
+            return None
+
+        if state.update_task and not state.update_task.done():
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(state.update_task), self.finish_wait_seconds
+                )
+            except asyncio.TimeoutError:
+                # La actualización sigue con el lock tomado: esperar más no tiene límite
+                logger.info(f"Análisis especulativo demasiado lento ({session_id}), se descarta")
+                return None
+            except Exception:
+                logger.exception("Error en la actualización especulativa")
+
+        try:
+            await self._advance(state, messages)
+        except Exception:
+            logger.exception("Error completando el análisis especulativo")
+            return None
+
+        if state.research_task and not state.research_task.done():
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(state.research_task), self.research_wait_seconds
+                )
+            except Exception:
+                # La investigación previa es opcional: el crew investiga igualmente
+                pass
+        return state
+
+    def discard(self, session_id: Optional[str]) -> None:
+        state = self._sessions.pop(session_id, None)
+        if state and state.research_task and not state.research_task.done():
+            state.research_task.cancel()
+
+    # ——————————————————————————
+    # Lógica interna
+    # ——————————————————————————
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _get_state(self, session_id: str) -> SessionAnalysis:
+        now = time.monotonic()
+        # Expirar sesiones abandonadas y respetar el tamaño máximo (LRU)
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) < self.max_sessions and now - oldest.touched_at < self.ttl_seconds:
+                break
+            self.discard(oldest_id)
+
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = SessionAnalysis(session_id)
+            self._sessions[session_id] = state
+        self._sessions.move_to_end(session_id)
+        state.touched_at = now
+        return state
+
+    async def _background_update(
+        self, state: SessionAnalysis, messages: List[ChatMessage], user_key: str
+    ) -> None:
+        if not admission_controller.try_acquire(SCORING, user_key):
+            logger.info(f"Análisis especulativo aplazado por carga ({state.session_id})")
+            return
+        try:
+            await self._advance(state, messages)
+        except Exception:
+            logger.exception(f"Error en el análisis especulativo ({state.session_id})")
+        finally:
+            admission_controller.release(SCORING, user_key)
+
+    async def _advance(self, state: SessionAnalysis, messages: List[ChatMessage]) -> None:
+        """
+        Procesa solo los mensajes posteriores a los ya analizados.
+        """
+        async with state.lock:
+            current = [(m.role, m.content) for m in messages]
+            if current[: len(state.processed)] != state.processed:
+                # La conversación no es continuación de lo analizado: se reinicia
+                state.processed, state.extracted, state.summary = [], {}, ""
+
+            new_messages = messages[len(state.processed):]
+            if not new_messages:
+                return
+            transcript = format_conversation(new_messages)
+
+            # El router decide por el tamaño de toda la conversación, no del
+            # tramo nuevo: un turno corto de una charla larga sigue siendo largo
+            conversation_chars = len(format_conversation(messages))
+            extraction = model_router.route(STAGE_EXTRACTION, conversation_chars=conversation_chars)
+            summary = model_router.route(
+                STAGE_SUMMARY,
+                conversation_chars=conversation_chars,
+                lead_quality=estimate_lead_quality(state.extracted),
+            )
+            extracted, summary_text = await asyncio.gather(
+                _tracked(extraction, OpenAIService.extract_lead_data(
+                    transcript,
+                    model=extraction.model,
+                    previous_data=state.extracted or None,
+                )),
+                _tracked(summary, OpenAIService.summarize_conversation(
+                    new_messages,
+                    model=summary.model,
+                    previous_summary=state.summary,
+                )),
+            )
+
+            state.extracted = merge_extracted(state.extracted, extracted)
+            state.summary = summary_text
+            state.processed = current
+            self._maybe_start_research(state)
+
+    def _maybe_start_research(self, state: SessionAnalysis) -> None:
+        company = str(state.extracted.get("empresa") or "").strip()
+        if not company or company == state.research_company:
+            return
+        if state.research_task and not state.research_task.done():
+            state.research_task.cancel()
+        state.research_company = company
+        state.research_task = asyncio.create_task(self._research(state, company))
+        self._track(state.research_task)
+
+    async def _research(self, state: SessionAnalysis, company: str) -> None:
+        from app.services.resilient_tools import ResilientSerperDevTool
+
+        query = f"{company} {state.extracted.get('necesidad') or ''}".strip()
+        try:
+            result = await asyncio.to_thread(ResilientSerperDevTool().run, search_query=query)
+        except Exception:
+            logger.exception(f"Error en la investigación previa de {company}")
+            return
+        if state.research_company == company:
+            state.research = str(result)[: settings.speculative_research_max_chars]
+
+
+# Instancia única global
+speculative_analyzer = SpeculativeAnalyzer.from_settings()
@@ -0,0 +1,223 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# Atributos estándar de LogRecord que no se copian como campos extra
+_RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime", "category", "fields"}
+
+
+def truncate_value(value: Any, max_chars: int, max_items: int = 50) -> Any:
+    """
+    Recorta cadenas largas y colecciones grandes para que ningún campo del
+    log crezca sin límite (conversaciones completas, salidas del crew...).
+    """
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return f"{value[:max_chars]}… [+{len(value) - max_chars} chars]"
+    if isinstance(value, dict):
+        items = list(value.items())
+        result = {str(k): truncate_value(v, max_chars, max_items) for k, v in items[:max_items]}
+        if len(items) > max_items:
+            result["…"] = f"+{len(items) - max_items} claves"
+        return result
+    if isinstance(value, (list, tuple)):
+        result = [truncate_value(v, max_chars, max_items) for v in value[:max_items]]
+        if len(value) > max_items:
+            result.append(f"… +{len(value) - max_items} elementos")
+        return result
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "model_dump"):
+        return truncate_value(value.model_dump(), max_chars, max_items)
+    return truncate_value(str(value), max_chars, max_items)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Serializa cada registro como una línea JSON. Los datos estructurados se
+    pasan con `extra={"category": ..., "fields": {...}}` y se recortan a
+    `max_field_chars` caracteres por campo.
+    """
+
+    def __init__(self, max_field_chars: int = 2000):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate_value(record.getMessage(), self.max_field_chars),
+        }
+        category = getattr(record, "category", None)
+        if category:
+            entry["category"] = category
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry["fields"] = truncate_value(fields, self.max_field_chars)
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = truncate_value(value, self.max_field_chars)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formato de texto para desarrollo (LOG_JSON=false). Añade al mensaje los
+    `fields` del registro como JSON, recortados igual que en JsonFormatter.
+    """
+
+    def __init__(self, max_field_chars: int = 2000):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if not fields:
+            return text
+        suffix = json.dumps(
+            truncate_value(fields, self.max_field_chars), ensure_ascii=False, default=str
+        )
+        # Los tracebacks van en líneas aparte: los campos se quedan con el mensaje
+        head, sep, rest = text.partition("\n")
+        return f"{head} {suffix}{sep}{rest}"
+
+
+class CategorySamplingFilter(logging.Filter):
+    """
+    Muestreo por categoría: un registro con `category` se conserva con la
+    probabilidad configurada. Los avisos y errores nunca se descartan.
+    """
+
+    def __init__(self, sample_rates: Dict[str, float], rng=random.random):
+        super().__init__()
+        self.sample_rates = dict(sample_rates)
+        self._rng = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.sample_rates.get(getattr(record, "category", None), 1.0)
+        return rate >= 1.0 or self._rng() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que loguea: el registro viaja
+    tal cual y el formateo y la escritura ocurren en el hilo del listener.
+    Si la cola está llena, el registro se descarta en lugar de bloquear; en
+    cuanto vuelve a haber sitio se encola un aviso con cuántos se perdieron.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Los tracebacks sí se renderizan aquí: los frames no deben cruzar hilos
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            return
+        if self._unreported:
+            self._report_dropped()
+
+    def _report_dropped(self) -> None:
+        count = self._unreported
+        warning = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            "Cola de logs llena: %d registros descartados", (count,), None,
+        )
+        warning.fields = {"dropped": count, "dropped_total": self.dropped}
+        try:
+            self.queue.put_nowait(warning)
+        except queue.Full:
+            return
+        self._unreported -= count
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def logging_stats() -> Dict[str, int]:
+    """
+    Estado de la cola de logs: registros pendientes y descartados por estar llena.
+    """
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
+
+def stop_logging() -> None:
+    """
+    Vacía la cola pendiente y detiene el hilo del listener.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    json_output: bool = True,
+    max_field_chars: int = 2000,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = 10000,
+    stream=None,
+) -> QueueListener:
+    """
+    Sustituye los handlers del logger raíz por un pipeline asíncrono:
+    filtro de muestreo → cola acotada → listener en hilo propio → stream.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        output.setFormatter(JsonFormatter(max_field_chars=max_field_chars))
+    else:
+        output.setFormatter(TextFormatter(max_field_chars=max_field_chars))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(CategorySamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    _queue_handler = queue_handler
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
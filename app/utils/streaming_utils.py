@@ -1,14 +1,21 @@
 import json
-from typing import AsyncGenerator
-from fastapi import Response
+import logging
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, Tuple
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 import asyncio
 
-async def format_sse_event(data: dict) -> str:
+logger = logging.getLogger(__name__)
+
+async def format_sse_event(data: dict, event: Optional[str] = None) -> str:
     """
     Dado un diccionario, lo convierte a la sintaxis SSE:
-    data: <json>\n\n
+    [event: <nombre>\n]data: <json>\n\n
     """
     json_str = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {json_str}\n\n"
     return f"data: {json_str}\n\n"
 
 
@@ -24,4 +31,74 @@ async def sse_response_generator(
         # Enviar con prefijo "data: " + doble salto de línea
         yield f"data: {data_str}\n\n"
         # Asegurarse de que se propague inmediatamente
-        await asyncio.sleep(0)
\ No newline at end of file
+        await asyncio.sleep(0)
+
+async def sse_event_generator(
+    queue: asyncio.Queue,
+    heartbeat_seconds: float = 15.0,
+) -> AsyncGenerator[str, None]:
+    """
+    Consume tuplas (evento, datos) de la cola y las emite como eventos SSE
+    con nombre, hasta recibir el sentinel `None`. Si no llega nada en
+    `heartbeat_seconds`, envía un comentario SSE para mantener viva la conexión.
+    """
+    while True:
+        try:
+            item = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+        except asyncio.TimeoutError:
+            yield ": heartbeat\n\n"
+            continue
+        if item is None:
+            break
+        event, data = item
+        yield await format_sse_event(data, event=event)
+
+
+def pipeline_event_stream(
+    pipeline: Callable[[Callable[[str, Any], None]], Awaitable[Any]],
+    heartbeat_seconds: float = 15.0,
+) -> Tuple["asyncio.Task", AsyncGenerator[str, None]]:
+    """
+    Ejecuta `pipeline(emit)` en una tarea propia y devuelve la tarea y el
+    generador SSE de sus eventos. `emit(evento, datos)` puede llamarse desde
+    cualquier hilo. El stream termina siempre con `result` (lo que devuelve
+    el pipeline) o con `error` ({status_code, detail}). La tarea no depende
+    del generador: si el cliente se desconecta, el pipeline sigue.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: str, data: Any) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, (event, jsonable_encoder(data)))
+
+    async def run() -> None:
+        try:
+            emit("result", await pipeline(emit))
+        except HTTPException as e:
+            emit("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception:
+            logger.exception("Error no controlado en el pipeline SSE")
+            emit("error", {"status_code": 500, "detail": "Error interno"})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    task = asyncio.create_task(run())
+    return task, sse_event_generator(queue, heartbeat_seconds=heartbeat_seconds)
+
+
+class CleanupStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que ejecuta `on_close` al terminar de servirse, también
+    si el envío falla o se cancela antes de empezar a iterar el cuerpo (en ese
+    caso el `finally` del generador nunca llega a ejecutarse).
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
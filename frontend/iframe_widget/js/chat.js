@@ -7,7 +7,7 @@
  * - Añade cada delta de la respuesta en tiempo real en la burbuja de asistente.
  * - Al acabar, elimina el indicador y guarda el texto final.
  * - Maneja "Shift+Enter" para nueva línea.
- * - Botón "✕" finaliza la conversación con POST /chat/finish.
+ * - Botón "✕" finaliza la conversación con POST /chat/finish/stream (SSE por etapas).
  */
 
 (() => {
@@ -16,7 +16,7 @@
   // ================================
   const API_BASE_URL = "http://127.0.0.1:8000";
   const STREAM_ENDPOINT = API_BASE_URL + "/chat/stream";
-  const FINISH_ENDPOINT = API_BASE_URL + "/chat/finish";
+  const FINISH_ENDPOINT = API_BASE_URL + "/chat/finish/stream";
 
   // ================================
   // 2) SELECTORES DEL DOM
@@ -28,6 +28,11 @@
 
   // Conversación (para enviar al backend)
   const conversation = [];
+  // Identificador de la sesión: permite al backend adelantar el análisis
+  const sessionId =
+    window.crypto && window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
   let isStreaming = false;
 
   // ================================
@@ -109,7 +114,8 @@
 
   /**
    * Dado un ReadableStream (body de fetch), parsea datos SSE (“data: {...}”).
-   * Por cada chunk JSON que encuentre, llama a onChunk(obj).
+   * Por cada chunk JSON que encuentre, llama a onChunk(obj, eventName).
+   * Las líneas de comentario (heartbeats “: ...”) se ignoran.
    */
   async function parseSseStream(stream, onChunk) {
     const reader = stream.getReader();
@@ -124,15 +130,19 @@
       buffer = parts.pop(); // última parte (incompleta)
 
       for (const part of parts) {
-        const trimmed = part.trim();
-        if (!trimmed) continue;
-        if (trimmed.startsWith("data:")) {
-          const jsonStr = trimmed.replace(/^data:\s*/, "");
-          try {
-            const obj = JSON.parse(jsonStr);
-            onChunk(obj);
-          } catch (e) {
-            console.error("Error parseando SSE chunk:", e, jsonStr);
+        let eventName = "message";
+        for (const line of part.split("\n")) {
+          const trimmed = line.trim();
+          if (trimmed.startsWith("event:")) {
+            eventName = trimmed.replace(/^event:\s*/, "");
+          } else if (trimmed.startsWith("data:")) {
+            const jsonStr = trimmed.replace(/^data:\s*/, "");
+            try {
+              const obj = JSON.parse(jsonStr);
+              onChunk(obj, eventName);
+            } catch (e) {
+              console.error("Error parseando SSE chunk:", e, jsonStr);
+            }
           }
         }
       }
@@ -175,7 +185,7 @@
       const resp = await fetch(STREAM_ENDPOINT, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ messages: conversation }),
+        body: JSON.stringify({ messages: conversation, session_id: sessionId }),
       });
 
       if (!resp.ok || !resp.body) {
@@ -224,7 +234,7 @@
       const payload = {
         messages: conversation,
         user_id: null,
-        session_id: null,
+        session_id: sessionId,
       };
       const resp = await fetch(FINISH_ENDPOINT, {
         method: "POST",
@@ -232,20 +242,34 @@
         body: JSON.stringify(payload),
       });
 
-      if (!resp.ok) {
+      if (!resp.ok || !resp.body) {
         const errorText = await resp.text();
         throw new Error(`HTTP ${resp.status}: ${errorText}`);
       }
 
-      const data = await resp.json();
+      // Progreso por etapas: el resumen se muestra en cuanto está listo
+      let data = null;
+      let streamError = null;
+      await parseSseStream(resp.body, (chunk, eventName) => {
+        if (eventName === "summary" && chunk.summary) {
+          appendMessage("assistant", "📝 Resumen de conversación:");
+          appendMessage("assistant", chunk.summary);
+        } else if (eventName === "crew_task") {
+          appendSystemMessage("⏳ Analizando el lead...");
+        } else if (eventName === "result") {
+          data = chunk;
+        } else if (eventName === "error") {
+          streamError = chunk.detail;
+        }
+      });
+
+      if (streamError || !data) {
+        throw new Error(streamError || "El servidor cerró el stream sin resultado");
+      }
       if (data.success) {
         appendSystemMessage(
           `✅ Lead enviado correctamente. ID CRM: ${data.airtable_record_id}`
         );
-        if (data.summary) {
-          appendMessage("assistant", "📝 Resumen de conversación:");
-          appendMessage("assistant", data.summary);
-        }
         setInputDisabled(true);
         sendBtn.style.display = "none";
         endChatBtn.disabled = true;
@@ -0,0 +1,103 @@
+"""
+Mide el coste, en el hilo que atiende la petición, de los logs de /chat/finish
+con una conversación larga: logging síncrono con f-strings (antes) frente al
+pipeline asíncrono con JSON y recorte de campos (después). El "después" se
+mide sin muestreo, para comparar solo el pipeline, y con el muestreo por
+defecto de conversaciones (10 %).
+
+Uso: python scripts/bench_logging.py [turnos] [iteraciones]
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.logging_utils import logging_stats, setup_logging, stop_logging  # noqa: E402
+
+
+def build_payloads(turns: int):
+    conversation = "\n".join(
+        f"USER: Mensaje {i} del lead contando detalles de su empresa, su sector, "
+        f"el problema que quiere resolver y el presupuesto que maneja. " * 3
+        + f"\nASSISTANT: Respuesta {i} del asistente con una pregunta de seguimiento."
+        for i in range(turns)
+    )
+    extracted = {
+        "nombre": "Lead de prueba",
+        "empresa": "Empresa S.L.",
+        "necesidad": "Necesidad detallada " * 50,
+        "presupuesto": "20000€",
+        "urgencia": "alta",
+        "tono": "positivo",
+    }
+    crew_result = {
+        "lead_score": 7.5,
+        "use_case_summary": "Resumen del caso de uso " * 80,
+        "talking_points": [f"Talking point {i} " * 20 for i in range(8)],
+    }
+    summary = "Resumen de la conversación " * 120
+    return conversation, extracted, crew_result, summary
+
+
+def log_before(logger, conversation, extracted, crew_result, summary):
+    logger.info(f"Full conversation:\n{conversation}")
+    logger.info(f"Extracted data: {extracted}")
+    logger.info(f"CrewAI result: {crew_result}")
+    logger.info(f"Summary text: {summary}")
+
+
+def log_after(logger, conversation, extracted, crew_result, summary):
+    logger.info("Conversación completa", extra={"category": "conversation", "fields": {"conversation": conversation}})
+    logger.info("Datos extraídos", extra={"category": "lead_data", "fields": {"extracted_data": extracted}})
+    logger.info("Resultado de CrewAI", extra={"category": "lead_data", "fields": {"crewai_result": crew_result}})
+    logger.info("Resumen generado", extra={"category": "lead_data", "fields": {"summary": summary}})
+
+
+def measure(fn, logger, payloads, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(logger, *payloads)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    payloads = build_payloads(turns)
+    logger = logging.getLogger("bench")
+
+    with open(os.devnull, "w") as sink:
+        root = logging.getLogger()
+        handler = logging.StreamHandler(sink)
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        before = measure(log_before, logger, payloads, iterations)
+        root.removeHandler(handler)
+
+        results = {}
+        for label, conversation_rate in (("100%", 1.0), ("10%", 0.1)):
+            # Cola suficiente para no descartar nada durante la medida
+            setup_logging(
+                sample_rates={"conversation": conversation_rate, "lead_data": 1.0},
+                queue_size=iterations * 4 + 1,
+                stream=sink,
+            )
+            after = measure(log_after, logger, payloads, iterations)
+            dropped = logging_stats()["dropped"]
+            drain_start = time.perf_counter()
+            stop_logging()
+            results[label] = (after, time.perf_counter() - drain_start, dropped)
+
+    print(f"Conversación: {turns} turnos, {len(payloads[0]):,} caracteres")
+    print(f"Antes   (síncrono, f-strings):               {before:9.1f} µs por /chat/finish")
+    for label, (after, drain, dropped) in results.items():
+        print(
+            f"Después (cola + JSON + recorte, conv. {label:>4}): {after:9.1f} µs por /chat/finish"
+            f"  · vaciado {drain * 1e3:.1f} ms · descartados {dropped}"
+        )
+
+
+if __name__ == "__main__":
+    main()
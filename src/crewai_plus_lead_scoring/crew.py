@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Any, Callable, Dict, List, Optional
 
 from crewai_tools import ScrapeWebsiteTool, SerperDevTool
 from pydantic import BaseModel, Field
@@ -26,31 +26,54 @@ class CrewaiPlusLeadScoringCrew:
     agents_config = "config/agents.yaml"
     tasks_config = "config/tasks.yaml"
 
+    # Modelo LLM de los agentes; None usa el LLM por defecto de crewAI
+    llm_model: Optional[str] = None
+
+    # Salida detallada de agentes y crew (prompts, pasos intermedios)
+    verbose_logs: bool = True
+
+    # Fábrica de herramientas de los agentes; None usa Serper + Scrape directos
+    tool_factory: Optional[Callable[[], List[Any]]] = None
+
+    def _tools(self) -> List[Any]:
+        if self.tool_factory:
+            return self.tool_factory()
+        return [SerperDevTool(), ScrapeWebsiteTool()]
+
+    def _agent_options(self) -> Dict[str, Any]:
+        """Opciones comunes a todos los agentes del crew."""
+        options: Dict[str, Any] = {}
+        if self.llm_model:
+            options["llm"] = self.llm_model
+        return options
 
     @agent
     def lead_analysis_agent(self) -> Agent:
         return Agent(
             config=self.agents_config["lead_analysis_agent"],
-            tools=[SerperDevTool(), ScrapeWebsiteTool()],
+            tools=self._tools(),
             allow_delegation=False,
-            verbose=True,
+            verbose=self.verbose_logs,
+            **self._agent_options(),
         )
 
     @agent
     def research_agent(self) -> Agent:
         return Agent(
             config=self.agents_config["research_agent"],
-            tools=[SerperDevTool(), ScrapeWebsiteTool()],
+            tools=self._tools(),
             allow_delegation=False,
-            verbose=True,
+            verbose=self.verbose_logs,
+            **self._agent_options(),
         )
 
     @agent
     def scoring_and_planning_agent(self) -> Agent:
         return Agent(
             config=self.agents_config["scoring_and_planning_agent"],
-            tools=[SerperDevTool(), ScrapeWebsiteTool()],
-            verbose=True,
+            tools=self._tools(),
+            verbose=self.verbose_logs,
+            **self._agent_options(),
         )
 
     @task
@@ -81,5 +104,5 @@ class CrewaiPlusLeadScoringCrew:
             agents=self.agents,
             tasks=self.tasks,
             process=Process.sequential,
-            verbose=True,
+            verbose=self.verbose_logs,
         )
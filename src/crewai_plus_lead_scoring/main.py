@@ -12,6 +12,8 @@ def run():
         "product_description": "<your_product_description>",
         "icp_description": "<ideal_customer_profile_description>",
         "form_response": "<form_response>",
+        "calibration_context": "<similar_scored_leads>",
+        "research_context": "<prefetched_company_research>",
     }
     CrewaiPlusLeadScoringCrew().crew().kickoff(inputs=inputs)
 
@@ -26,6 +28,8 @@ def train():
         "product_description": "<your_product_description>",
         "icp_description": "<ideal_customer_profile_description>",
         "form_response": "<form_response>",
+        "calibration_context": "<similar_scored_leads>",
+        "research_context": "<prefetched_company_research>",
     }
     try:
         CrewaiPlusLeadScoringCrew().crew().train(
@@ -57,6 +61,8 @@ def test():
         "product_description": "<your_product_description>",
         "icp_description": "<ideal_customer_profile_description>",
         "form_response": "<form_response>",
+        "calibration_context": "<similar_scored_leads>",
+        "research_context": "<prefetched_company_research>",
     }
     try:
         CrewaiPlusLeadScoringCrew().crew().test(
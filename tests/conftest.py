@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# Settings exige estas variables al importarse; en los tests basta con valores ficticios
+for _name in (
+    "OPENAI_API_KEY",
+    "AIRTABLE_API_KEY",
+    "AIRTABLE_BASE_ID",
+    "AIRTABLE_TABLE_NAME",
+    "CREWAI_AGENTS_CONFIG",
+    "CREWAI_TASKS_CONFIG",
+    "SERPER_API_KEY",
+    "COMPANY_NAME",
+    "PRODUCT_NAME",
+    "PRODUCT_DESCRIPTION",
+    "ICP_DESCRIPTION",
+):
+    os.environ.setdefault(_name, "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """
+    Reloj manual para los componentes que aceptan `clock`/`sleep` inyectables:
+    `sleep` avanza el tiempo sin esperar de verdad.
+    """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
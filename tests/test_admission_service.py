@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from app.services.admission_service import (
+    INTERACTIVE,
+    SCORING,
+    AdmissionController,
+    AdmissionRejected,
+)
+
+
+def make_controller(**overrides) -> AdmissionController:
+    options = dict(
+        global_limit=1,
+        per_user_limit=1,
+        lane_limits={INTERACTIVE: 1, SCORING: 1},
+        max_waiting={INTERACTIVE: 4, SCORING: 4},
+        max_wait_seconds=1.0,
+        retry_after_seconds=3,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_interactive_waiters_are_served_before_scoring():
+    async def scenario():
+        controller = make_controller(per_user_limit=10)
+        await controller.acquire(SCORING, "holder")
+        order = []
+
+        async def wait_for(lane, user):
+            await controller.acquire(lane, user)
+            order.append(lane)
+
+        scoring = asyncio.create_task(wait_for(SCORING, "a"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait_for(INTERACTIVE, "b"))
+        await asyncio.sleep(0)
+
+        controller.release(SCORING, "holder")
+        await interactive
+        assert order == [INTERACTIVE]
+        controller.release(INTERACTIVE, "b")
+        await scoring
+        assert order == [INTERACTIVE, SCORING]
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        controller = make_controller(max_waiting={INTERACTIVE: 1, SCORING: 1})
+        await controller.acquire(INTERACTIVE, "a")
+        waiting = asyncio.create_task(controller.acquire(INTERACTIVE, "b"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire(INTERACTIVE, "c")
+        assert excinfo.value.retry_after == 3
+        assert controller.stats()[INTERACTIVE]["rejected"] == 1
+        waiting.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_rejects_after_max_wait():
+    async def scenario():
+        controller = make_controller(max_wait_seconds=0.01)
+        await controller.acquire(INTERACTIVE, "a")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(INTERACTIVE, "b")
+        assert controller.stats()[INTERACTIVE]["waiting"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiter_blocked_by_user_limit_does_not_block_others():
+    async def scenario():
+        controller = make_controller(global_limit=2, lane_limits={INTERACTIVE: 2, SCORING: 1})
+        await controller.acquire(INTERACTIVE, "busy")
+        await controller.acquire(INTERACTIVE, "other")
+
+        same_user = asyncio.create_task(controller.acquire(INTERACTIVE, "busy"))
+        await asyncio.sleep(0)
+        new_user = asyncio.create_task(controller.acquire(INTERACTIVE, "fresh"))
+        await asyncio.sleep(0)
+
+        controller.release(INTERACTIVE, "other")
+        await new_user
+        assert not same_user.done()
+        same_user.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = make_controller()
+        await controller.acquire(INTERACTIVE, "a")
+        waiting = asyncio.create_task(controller.acquire(INTERACTIVE, "b"))
+        await asyncio.sleep(0)
+        assert controller.stats()[INTERACTIVE]["waiting"] == 1
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert controller.stats()[INTERACTIVE]["waiting"] == 0
+
+        controller.release(INTERACTIVE, "a")
+        assert controller.try_acquire(INTERACTIVE, "c")
+
+    asyncio.run(scenario())
+
+
+def test_ticket_release_is_idempotent():
+    async def scenario():
+        controller = make_controller()
+        async with controller.slot(INTERACTIVE, "a") as ticket:
+            ticket.release()
+        assert controller.stats()[INTERACTIVE]["active"] == 0
+        assert controller.try_acquire(INTERACTIVE, "a")
+
+    asyncio.run(scenario())
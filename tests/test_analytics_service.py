@@ -0,0 +1,60 @@
+import math
+
+import pytest
+
+from app.services.analytics_service import LeadAnalyticsStore, parse_budget
+
+
+def make_record(score: float, sector: str, budget: str = "") -> dict:
+    return {
+        "timestamp": "2025-06-01T10:00:00",
+        "crewai_data": {"lead_score": score},
+        "extracted_data": {"sector": sector, "presupuesto": budget, "urgencia": "alta"},
+        "metadata": {"models": {"crew": "gpt-4.1-mini"}, "latency_seconds": 30.0},
+    }
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("5000€", 5000),
+        ("20.000 €", 20000),
+        ("10k", 10000),
+        ("1,5 millones", 1_500_000),
+        ("5000 mensuales", 5000),
+        ("entre 3 y 5 mil", 4000),
+        ("3-5k", 4000),
+        ("5 mil y 2 personas", 5000),
+    ],
+)
+def test_parse_budget(text, expected):
+    assert parse_budget(text) == expected
+
+
+def test_parse_budget_without_amount_is_nan():
+    assert math.isnan(parse_budget("a definir"))
+
+
+def test_append_persists_and_groups(tmp_path):
+    store = LeadAnalyticsStore(str(tmp_path), initial_capacity=2)
+    for i, sector in enumerate(["retail", "retail", "salud"]):
+        assert store.append(f"lead{i}", make_record(float(i), sector))
+    assert not store.append("lead0", make_record(9.0, "retail"))
+
+    reopened = LeadAnalyticsStore(str(tmp_path))
+    result = reopened.query(group_by="sector")
+    assert result["count"] == 3
+    assert {g["group"]: g["count"] for g in result["groups"]} == {"retail": 2, "salud": 1}
+
+
+def test_interrupted_append_is_rolled_back(tmp_path):
+    store = LeadAnalyticsStore(str(tmp_path))
+    store.append("lead0", make_record(5.0, "retail"))
+    # Simula un corte tras registrar el id pero antes de guardar meta.json
+    with open(tmp_path / "lead_ids.txt", "a", encoding="utf-8") as f:
+        f.write("lead1\n")
+
+    reopened = LeadAnalyticsStore(str(tmp_path))
+    assert len(reopened) == 1
+    assert reopened.append("lead1", make_record(7.0, "salud"))
+    assert reopened.query()["count"] == 2
@@ -0,0 +1,88 @@
+import json
+import random
+
+import pytest
+
+from app.services.lead_index import LeadIndex, build_calibration_context, lead_text_from_conversation
+
+
+def random_text(rng: random.Random, words: int = 40) -> str:
+    return " ".join(f"palabra{rng.randrange(20000)}" for _ in range(words))
+
+
+def test_grows_beyond_initial_capacity():
+    index = LeadIndex(n_features=64, initial_capacity=2)
+    for i in range(5):
+        index.add(f"lead{i}", f"texto distinto número{i} sobre empresa{i}")
+    assert len(index) == 5
+    assert index.search("número3 empresa3", k=1)[0]["lead_id"] == "lead3"
+
+
+def test_add_replaces_existing_lead():
+    index = LeadIndex(n_features=64)
+    index.add("lead", "retail tiendas", {"lead_score": 3})
+    index.add("lead", "hospital clínica", {"lead_score": 8})
+    assert len(index) == 1
+    assert index.search("hospital clínica", k=1)[0]["lead_score"] == 8
+
+
+def test_search_k_edge_cases():
+    index = LeadIndex(n_features=64)
+    assert index.search("algo", k=3) == []
+    index.add("solo", "texto único")
+    assert index.search("texto", k=0) == []
+    assert len(index.search("texto", k=10)) == 1
+    assert index.search("texto", k=3, exclude_id="solo") == []
+
+
+def test_similar_to_excludes_itself_and_raises_for_unknown_lead():
+    index = LeadIndex(n_features=64)
+    index.add("a", "clínica dental pacientes citas")
+    index.add("b", "clínica veterinaria pacientes citas")
+    assert [r["lead_id"] for r in index.similar_to("a", k=5)] == ["b"]
+    with pytest.raises(KeyError):
+        index.similar_to("no-existe")
+
+
+def test_unrelated_leads_stay_below_noise_floor():
+    rng = random.Random(0)
+    index = LeadIndex()
+    for i in range(5000):
+        index.add(str(i), random_text(rng))
+
+    floor = index.noise_floor()
+    noise = index.search(random_text(rng), k=5)
+    assert all(r["similarity"] < floor for r in noise)
+
+    # Un lead que comparte la mitad del texto sí supera el suelo
+    original = random_text(rng)
+    index.add("original", original)
+    related = " ".join(original.split()[:20]) + " " + random_text(rng, 20)
+    assert index.search(related, k=1)[0]["lead_id"] == "original"
+    assert index.search(related, k=1)[0]["similarity"] > floor
+
+
+def test_calibration_context_skips_weak_matches():
+    similar = [
+        {"lead_id": "a", "similarity": 0.6, "lead_score": 8, "use_case_summary": "CRM", "talking_points": []},
+        {"lead_id": "b", "similarity": 0.3, "lead_score": 2, "use_case_summary": "ruido", "talking_points": []},
+    ]
+    context = build_calibration_context(similar, min_similarity=0.4)
+    assert "CRM" in context and "ruido" not in context
+    assert build_calibration_context(similar[1:], min_similarity=0.4) == "No hay leads anteriores comparables."
+
+
+def test_load_directory_indexes_user_text_once(tmp_path):
+    record = {
+        "conversation": "USER: necesitamos un CRM para la clínica\nASSISTANT: ¿Cuántos usuarios?",
+        "crewai_data": {"lead_score": 7, "use_case_summary": "CRM clínico", "talking_points": ["a"]},
+    }
+    (tmp_path / "lead_s1_20250101_000000.json").write_text(json.dumps(record), encoding="utf-8")
+    (tmp_path / "lead_roto.json").write_text("{no es json", encoding="utf-8")
+
+    index = LeadIndex(n_features=64)
+    assert index.load_directory(str(tmp_path)) == 1
+    assert index.load_directory(str(tmp_path)) == 0
+    match = index.search(lead_text_from_conversation(record["conversation"]), k=1)[0]
+    assert match["lead_id"] == "s1_20250101_000000"
+    assert match["lead_score"] == 7
@@ -0,0 +1,61 @@
+import logging
+import queue
+
+from app.utils.logging_utils import (
+    CategorySamplingFilter,
+    NonBlockingQueueHandler,
+    TextFormatter,
+    truncate_value,
+)
+
+
+def make_record(msg: str, level: int = logging.INFO, category=None) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 0, msg, (), None)
+    if category:
+        record.category = category
+    return record
+
+
+def test_truncate_value_limits_strings_and_collections():
+    assert truncate_value("x" * 10, 4) == "xxxx… [+6 chars]"
+    assert truncate_value(list(range(5)), 100, max_items=2) == [0, 1, "… +3 elementos"]
+
+
+def test_text_formatter_keeps_truncated_fields():
+    formatter = TextFormatter(max_field_chars=4)
+    record = make_record("lead guardado")
+    record.fields = {"lead_id": "abcdefgh", "score": 7}
+
+    assert formatter.format(record) == (
+        'INFO:test:lead guardado {"lead_id": "abcd… [+4 chars]", "score": 7}'
+    )
+    assert formatter.format(make_record("sin campos")) == "INFO:test:sin campos"
+
+
+def test_sampling_never_drops_warnings():
+    sampler = CategorySamplingFilter({"conversation": 0.0})
+    assert not sampler.filter(make_record("a", category="conversation"))
+    assert sampler.filter(make_record("a", logging.WARNING, category="conversation"))
+    assert sampler.filter(make_record("a", category="otra"))
+
+
+def test_dropped_records_are_counted_and_reported():
+    log_queue: queue.Queue = queue.Queue(maxsize=2)
+    handler = NonBlockingQueueHandler(log_queue)
+
+    for msg in ("primero", "segundo", "perdido", "perdido"):
+        handler.emit(make_record(msg))
+    assert handler.dropped == 2
+
+    # Hay sitio para el registro, pero no para el aviso: queda pendiente
+    log_queue.get_nowait()
+    handler.emit(make_record("después"))
+    assert log_queue.full()
+
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    handler.emit(make_record("otro"))
+    assert log_queue.get_nowait().getMessage() == "otro"
+    report = log_queue.get_nowait()
+    assert report.levelno == logging.WARNING
+    assert report.fields == {"dropped": 2, "dropped_total": 2}
@@ -0,0 +1,48 @@
+from app.services.model_router import STAGE_CREW, ModelRouter
+
+TIERS = ["nano", "mini", "big"]
+
+
+def make_router(clock, rng=lambda: 1.0, log_path=None, exploration_rate=0.0) -> ModelRouter:
+    return ModelRouter(
+        tiers=TIERS,
+        short_chars=1500,
+        long_chars=6000,
+        latency_targets={STAGE_CREW: 90.0},
+        cost_targets={},
+        log_path=log_path,
+        latency_ttl_seconds=600.0,
+        exploration_rate=exploration_rate,
+        clock=clock,
+        rng=rng,
+    )
+
+
+def test_slow_model_is_skipped_until_its_latency_expires(clock):
+    router = make_router(clock)
+    decision = router.route(STAGE_CREW, 8000, 0.9)
+    assert decision.model == "big"
+
+    router.record_outcome(decision, 120.0, True)
+    assert router.route(STAGE_CREW, 8000, 0.9).model == "mini"
+
+    clock.now += 601
+    assert router.route(STAGE_CREW, 8000, 0.9).model == "big"
+
+
+def test_exploration_ignores_latency(clock):
+    router = make_router(clock, rng=lambda: 0.0, exploration_rate=0.05)
+    router.record_outcome(router.route(STAGE_CREW, 8000, 0.9), 120.0, True)
+
+    decision = router.route(STAGE_CREW, 8000, 0.9)
+    assert decision.model == "big"
+    assert "exploración" in decision.reason
+
+
+def test_outcomes_are_written_off_thread(clock, tmp_path):
+    log_path = tmp_path / "routing.jsonl"
+    router = make_router(clock, log_path=str(log_path))
+    for _ in range(3):
+        router.record_outcome(router.route(STAGE_CREW, 100), 1.0, True)
+    router.close()
+    assert len(log_path.read_text(encoding="utf-8").splitlines()) == 3
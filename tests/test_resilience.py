@@ -0,0 +1,158 @@
+import time
+
+import pytest
+
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    FaultInjector,
+    RetryBudget,
+    TransientUpstreamError,
+    Upstream,
+    UpstreamPolicy,
+)
+
+
+def sequence(*values):
+    """rng determinista: devuelve los valores en orden y después 1.0."""
+    remaining = list(values)
+    return lambda: remaining.pop(0) if remaining else 1.0
+
+
+def failing_times(n: int, result="ok") -> FaultInjector:
+    # Cada llamada consume dos valores: ¿lenta? y ¿error?
+    return FaultInjector(lambda: result, error_rate=0.5, rng=sequence(*([1.0, 0.0] * n)))
+
+
+def make_upstream(clock, **policy) -> Upstream:
+    options = dict(name="test", timeout_seconds=10.0, max_attempts=3)
+    options.update(policy)
+    return Upstream(
+        UpstreamPolicy(**options),
+        breaker=CircuitBreaker(failure_threshold=5, clock=clock),
+        budget=RetryBudget(ratio=0.0, min_tokens=10.0),
+        clock=clock,
+        sleep=clock.sleep,
+        rng=lambda: 0.5,
+    )
+
+
+def test_deadline_stops_waiting_for_a_slow_call():
+    upstream = Upstream(UpstreamPolicy(name="slow", timeout_seconds=0.05))
+    slow = FaultInjector(lambda: "ok", latency_seconds=0.5, slow_rate=1.0)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        upstream.call(slow, idempotent=True)
+    assert time.monotonic() - start < 0.4
+    assert slow.calls == 1
+
+
+def test_idempotent_calls_retry_with_jittered_backoff(clock):
+    upstream = make_upstream(clock, backoff_base_seconds=0.2)
+    flaky = failing_times(2)
+
+    assert upstream.call(flaky, idempotent=True) == "ok"
+    assert flaky.calls == 3
+    # Backoff exponencial (0.2, 0.4) por el jitter fijo de 0.5
+    assert clock.now == pytest.approx(0.1 + 0.2)
+
+
+def test_non_idempotent_calls_only_retry_transient_errors(clock):
+    upstream = make_upstream(clock)
+    flaky = failing_times(1)
+    flaky.error = lambda: RuntimeError("respuesta a medias")
+
+    with pytest.raises(RuntimeError):
+        upstream.call(flaky)
+    assert flaky.calls == 1
+
+    transient = failing_times(1)
+    assert upstream.call(transient) == "ok"
+    assert transient.calls == 2
+
+
+def test_retry_budget_limits_retries(clock):
+    upstream = make_upstream(clock, max_attempts=10)
+    upstream.budget = RetryBudget(ratio=0.0, min_tokens=2.0)
+    always_failing = FaultInjector(lambda: "ok", error_rate=1.0)
+
+    with pytest.raises(TransientUpstreamError):
+        upstream.call(always_failing, idempotent=True)
+    # Un intento inicial más los dos reintentos que permite el presupuesto
+    assert always_failing.calls == 3
+
+
+def test_errors_rejected_by_is_retryable_do_not_open_the_breaker(clock):
+    upstream = make_upstream(clock, is_retryable=lambda e: not isinstance(e, ValueError))
+    bad_request = FaultInjector(lambda: "ok", error_rate=1.0, error=lambda: ValueError("400"))
+
+    for _ in range(10):
+        with pytest.raises(ValueError):
+            upstream.call(bad_request, idempotent=True)
+    assert bad_request.calls == 10
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_then_half_opens_then_closes(clock):
+    upstream = make_upstream(clock, max_attempts=1)
+    upstream.breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=30.0, clock=clock)
+    failing = FaultInjector(lambda: "ok", error_rate=1.0)
+
+    for _ in range(2):
+        with pytest.raises(TransientUpstreamError):
+            upstream.call(failing)
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+
+    # Abierto: falla rápido sin llamar al upstream
+    with pytest.raises(CircuitOpenError):
+        upstream.call(failing)
+    assert failing.calls == 2
+
+    # Pasado el reset, una llamada de prueba fallida lo vuelve a abrir
+    clock.now += 30.0
+    assert upstream.breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(TransientUpstreamError):
+        upstream.call(failing)
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+
+    # ...y una llamada de prueba correcta lo cierra
+    clock.now += 30.0
+    assert upstream.call(lambda: "ok") == "ok"
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=5.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 5.0
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_hedged_request_wins_over_a_slow_first_attempt():
+    upstream = Upstream(
+        UpstreamPolicy(name="hedged", timeout_seconds=2.0, hedge_percentile=50, hedge_min_samples=1),
+    )
+    upstream.latency.record(0.01)
+    # Solo la primera llamada es lenta
+    slow_first = FaultInjector(
+        lambda: "ok", latency_seconds=1.0, slow_rate=0.5, rng=sequence(0.0, 1.0, 1.0, 1.0)
+    )
+
+    start = time.monotonic()
+    assert upstream.call(slow_first, idempotent=True) == "ok"
+    assert time.monotonic() - start < 0.5
+    assert slow_first.calls == 2
+
+
+def test_non_idempotent_calls_are_not_hedged():
+    upstream = Upstream(
+        UpstreamPolicy(name="hedged", timeout_seconds=2.0, hedge_percentile=50, hedge_min_samples=1),
+    )
+    upstream.latency.record(0.01)
+    slow = FaultInjector(lambda: "ok", latency_seconds=0.1, slow_rate=1.0)
+
+    assert upstream.call(slow) == "ok"
+    assert slow.calls == 1
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+pytest.importorskip("crewai_tools")
+
+import requests  # noqa: E402
+
+from app.services.resilient_tools import socket_timeout  # noqa: E402
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Sustituye el envío real por uno que anota el timeout de cada petición."""
+    timeouts = []
+
+    def fake_request(self, method, url, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    return timeouts
+
+
+def test_timeout_applies_only_inside_the_block(sent):
+    original = requests.Session.request
+    with socket_timeout(3.0):
+        requests.Session().request("GET", "http://example.com")
+        requests.Session().request("GET", "http://example.com", timeout=1.0)
+    requests.Session().request("GET", "http://example.com")
+
+    assert sent == [3.0, 1.0, None]
+    assert requests.Session.request is original
+
+
+def test_other_threads_keep_their_own_timeout(sent):
+    inside, outside_done = threading.Event(), threading.Event()
+
+    def other_thread():
+        inside.wait()
+        requests.Session().request("GET", "http://example.com")
+        outside_done.set()
+
+    worker = threading.Thread(target=other_thread)
+    worker.start()
+    with socket_timeout(3.0):
+        inside.set()
+        outside_done.wait()
+        requests.Session().request("GET", "http://example.com")
+    worker.join()
+
+    assert sent == [None, 3.0]
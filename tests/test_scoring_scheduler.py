@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from app.services.admission_service import AdmissionRejected
+from app.services.scoring_scheduler import COLD, HOT, WARM, ScoringScheduler, classify_lead
+
+
+def make_scheduler(clock, concurrency=1, **overrides) -> ScoringScheduler:
+    options = dict(
+        lane_limits={HOT: 1, WARM: 1, COLD: 1},
+        aging_seconds=0,
+        max_waiting={HOT: 4, WARM: 4, COLD: 4},
+        max_wait_seconds=5.0,
+        per_user_limit=10,
+        retry_after_seconds=30,
+    )
+    options.update(overrides)
+    return ScoringScheduler(concurrency, clock=clock, **options)
+
+
+def test_classify_lead_by_intent_signals():
+    hot, signals = classify_lead(
+        {"urgencia": "alta", "presupuesto": "30.000 €", "tamano_empresa": "300 empleados"}
+    )
+    assert hot == HOT
+    assert signals["points"] == 6
+    assert classify_lead({"urgencia": "media", "presupuesto": "6000€", "tamano_empresa": "pyme"})[0] == WARM
+    assert classify_lead({})[0] == COLD
+
+
+async def settle():
+    # Deja correr al event loop hasta que las tareas despertadas arranquen
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _queue(scheduler, lane, started, user_key="u"):
+    async with scheduler.slot(lane, user_key):
+        started.append(lane)
+        await asyncio.Event().wait()
+
+
+def test_higher_lane_goes_first_when_a_slot_frees(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock)
+        await scheduler.acquire(COLD, "holder")
+        started = []
+        tasks = [asyncio.create_task(_queue(scheduler, lane, started)) for lane in (COLD, WARM, HOT)]
+        await settle()
+
+        scheduler.release(COLD, "holder")
+        await settle()
+        assert started == [HOT]
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_lane_borrows_idle_capacity_only_when_no_higher_lane_waits(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock, 2, lane_limits={HOT: 2, WARM: 2, COLD: 1})
+        started = []
+        tasks = [asyncio.create_task(_queue(scheduler, COLD, started)) for _ in range(3)]
+        await settle()
+        # Solo hay leads fríos: usan los dos huecos globales
+        assert started == [COLD, COLD]
+
+        tasks.append(asyncio.create_task(_queue(scheduler, HOT, started)))
+        await settle()
+        tasks[0].cancel()
+        await settle()
+        # Con un lead caliente esperando, el hueco es suyo y no del tercer frío
+        assert started == [COLD, COLD, HOT]
+        assert scheduler.stats()[COLD]["waiting"] == 1
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_aging_prevents_starvation(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock, aging_seconds=10)
+        await scheduler.acquire(HOT, "holder")
+        started = []
+        tasks = [asyncio.create_task(_queue(scheduler, COLD, started))]
+        await settle()
+
+        clock.now = 25.0
+        tasks.append(asyncio.create_task(_queue(scheduler, HOT, started)))
+        await settle()
+
+        scheduler.release(HOT, "holder")
+        await settle()
+        assert started == [COLD]
+        assert scheduler.stats()[COLD]["promoted"] == 1
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waits_are_not_counted_as_completed(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock, lane_limits={})
+        await scheduler.acquire(HOT, "holder")
+        waiting = asyncio.create_task(scheduler.acquire(COLD, "u"))
+        await settle()
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        scheduler.release(HOT, "holder")
+        stats = scheduler.stats()
+        assert stats[COLD]["cancelled"] == 1
+        assert stats[COLD]["completed"] == 0
+        assert stats[COLD]["waiting"] == 0
+        assert stats[HOT]["completed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_the_lane_queue_is_full(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock, max_waiting={HOT: 4, WARM: 4, COLD: 1})
+        await scheduler.acquire(HOT, "holder")
+        waiting = asyncio.create_task(scheduler.acquire(COLD, "a"))
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await scheduler.acquire(COLD, "b")
+        assert excinfo.value.retry_after == 30
+        # La cola fría llena no afecta a los otros carriles
+        hot = asyncio.create_task(scheduler.acquire(HOT, "c"))
+        await settle()
+        assert scheduler.stats()[COLD]["rejected"] == 1
+        assert scheduler.stats()[HOT]["waiting"] == 1
+        waiting.cancel()
+        hot.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_rejects_after_max_wait(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock, max_wait_seconds=0.01)
+        await scheduler.acquire(HOT, "holder")
+        with pytest.raises(AdmissionRejected):
+            await scheduler.acquire(WARM, "u")
+        stats = scheduler.stats()[WARM]
+        assert (stats["waiting"], stats["rejected"]) == (0, 1)
+        # Quien se rindió ya no cuenta para su límite de usuario
+        assert scheduler._user_runs == {"holder": 1}
+
+    asyncio.run(scenario())
+
+
+def test_per_user_limit_counts_queued_and_running_crews(clock):
+    async def scenario():
+        scheduler = make_scheduler(clock, per_user_limit=2)
+        await scheduler.acquire(HOT, "busy")
+        queued = asyncio.create_task(scheduler.acquire(COLD, "busy"))
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await scheduler.acquire(HOT, "busy")
+        assert "usuario" in excinfo.value.reason
+        other = asyncio.create_task(scheduler.acquire(HOT, "other"))
+        await settle()
+        assert not other.done()
+
+        # Al terminar su crew, el usuario vuelve a tener sitio
+        scheduler.release(HOT, "busy")
+        await settle()
+        assert other.done()
+        queued.cancel()
+        await settle()
+        third = asyncio.create_task(scheduler.acquire(WARM, "busy"))
+        await settle()
+        assert not third.done()
+        assert scheduler.stats()[WARM]["waiting"] == 1
+        third.cancel()
+
+    asyncio.run(scenario())
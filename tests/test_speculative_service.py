@@ -0,0 +1,154 @@
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from app.models import ChatMessage  # noqa: E402
+from app.services import speculative_service  # noqa: E402
+from app.services.speculative_service import (  # noqa: E402
+    SessionAnalysis,
+    SpeculativeAnalyzer,
+    format_conversation,
+    merge_extracted,
+)
+
+
+class FakeRouter:
+    def __init__(self):
+        self.routed = []
+
+    def route(self, stage, conversation_chars, lead_quality=None):
+        self.routed.append((stage, conversation_chars))
+        return SimpleNamespace(model="nano")
+
+    @contextmanager
+    def track(self, decision):
+        yield decision
+
+
+class FakeOpenAI:
+    """Devuelve lo que se le indique y guarda con qué se le llamó."""
+
+    def __init__(self, extracted=None):
+        self.extracted = extracted or {}
+        self.extract_calls = []
+
+    async def extract_lead_data(self, transcript, model, previous_data=None):
+        self.extract_calls.append((transcript, previous_data))
+        return dict(self.extracted)
+
+    async def summarize_conversation(self, messages, model, previous_summary=""):
+        return f"{previous_summary}+{len(messages)}"
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    router, openai = FakeRouter(), FakeOpenAI()
+    monkeypatch.setattr(speculative_service, "model_router", router)
+    monkeypatch.setattr(speculative_service, "OpenAIService", openai)
+    return router, openai
+
+
+def make_analyzer(**overrides) -> SpeculativeAnalyzer:
+    options = dict(
+        max_sessions=10,
+        ttl_seconds=3600.0,
+        finish_wait_seconds=1.0,
+        research_wait_seconds=0.01,
+    )
+    options.update(overrides)
+    return SpeculativeAnalyzer(**options)
+
+
+def chat(*contents):
+    roles = ("user", "assistant")
+    return [ChatMessage(role=roles[i % 2], content=c) for i, c in enumerate(contents)]
+
+
+def test_merge_extracted_keeps_previous_values_over_empty_ones():
+    previous = {"nombre": "Ana", "empresa": "Acme", "presupuesto": ""}
+    new = {"nombre": "", "empresa": "Acme SL", "presupuesto": None, "urgencia": ""}
+
+    assert merge_extracted(previous, new) == {
+        "nombre": "Ana",
+        "empresa": "Acme SL",
+        "presupuesto": "",
+        "urgencia": "",
+    }
+
+
+def test_only_new_messages_are_sent_but_routing_sees_the_whole_conversation(fakes):
+    router, openai = fakes
+    analyzer = make_analyzer()
+    state = SessionAnalysis("s")
+    first = chat("hola", "¿en qué te ayudo?")
+    second = first + chat("busco un CRM")
+
+    openai.extracted = {"nombre": "Ana"}
+
+    async def scenario():
+        await analyzer._advance(state, first)
+        openai.extracted = {"necesidad": "CRM"}
+        await analyzer._advance(state, second)
+
+    asyncio.run(scenario())
+    assert openai.extract_calls[1] == (format_conversation(second[2:]), {"nombre": "Ana"})
+    assert state.extracted == {"nombre": "Ana", "necesidad": "CRM"}
+    assert router.routed[-1][1] == len(format_conversation(second))
+    assert state.summary == "+2+1"
+
+
+def test_diverging_conversation_resets_the_analysis(fakes):
+    _, openai = fakes
+    analyzer = make_analyzer()
+    state = SessionAnalysis("s")
+    openai.extracted = {"necesidad": "CRM"}
+
+    async def scenario():
+        await analyzer._advance(state, chat("busco un CRM", "genial"))
+        openai.extracted = {"nombre": "Luis"}
+        await analyzer._advance(state, chat("soy Luis", "hola Luis"))
+
+    asyncio.run(scenario())
+    # La segunda conversación se analiza entera y sin arrastrar datos de la primera
+    assert openai.extract_calls[1] == (format_conversation(chat("soy Luis", "hola Luis")), None)
+    assert state.extracted == {"nombre": "Luis"}
+    assert state.summary == "+2"
+
+
+def test_finalize_gives_up_on_a_slow_update(fakes):
+    analyzer = make_analyzer(finish_wait_seconds=0.01)
+
+    async def scenario():
+        state = analyzer._get_state("s")
+        state.update_task = asyncio.create_task(asyncio.sleep(10))
+        assert await analyzer.finalize("s", chat("hola")) is None
+        assert not state.update_task.done()
+        analyzer.discard("s")
+        state.update_task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_finalize_does_not_wait_for_slow_research(fakes):
+    analyzer = make_analyzer(research_wait_seconds=0.01)
+
+    async def scenario():
+        state = analyzer._get_state("s")
+        state.research_task = asyncio.create_task(asyncio.sleep(10))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        assert await analyzer.finalize("s", chat("hola")) is state
+        assert loop.time() - start < 1.0
+        assert state.research == ""
+        # La búsqueda sigue en marcha hasta que se descarta la sesión
+        assert not state.research_task.done()
+        analyzer.discard("s")
+        await asyncio.sleep(0)
+        assert state.research_task.cancelled()
+
+    asyncio.run(scenario())
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.streaming_utils import (
+    CleanupStreamingResponse,
+    pipeline_event_stream,
+    sse_event_generator,
+)
+
+
+def parse_events(chunks):
+    """(evento, datos) de cada evento SSE; los heartbeats como ("heartbeat", None)."""
+    events = []
+    for chunk in chunks:
+        if chunk.startswith(":"):
+            events.append(("heartbeat", None))
+            continue
+        lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def collect(generator):
+    return [chunk async for chunk in generator]
+
+
+def test_event_generator_sends_heartbeats_while_idle_and_stops_at_sentinel():
+    async def scenario():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def producer():
+            await asyncio.sleep(0.05)
+            queue.put_nowait(("summary", {"summary": "ok"}))
+            queue.put_nowait(None)
+            queue.put_nowait(("ignored", {}))
+
+        asyncio.create_task(producer())
+        return await collect(sse_event_generator(queue, heartbeat_seconds=0.01))
+
+    events = parse_events(asyncio.run(scenario()))
+    assert events[0] == ("heartbeat", None)
+    assert events[-1] == ("summary", {"summary": "ok"})
+    assert all(name == "heartbeat" for name, _ in events[:-1])
+
+
+def test_pipeline_stream_emits_stages_in_order_then_result():
+    async def pipeline(emit):
+        emit("extracted_data", {"nombre": "Ana"})
+        await asyncio.sleep(0)
+        # El crew publica desde su propio hilo
+        await asyncio.to_thread(emit, "queued", {"lane": "hot"})
+        emit("stored", {"lead_id": "l1"})
+        return {"lead_id": "l1"}
+
+    async def scenario():
+        task, events = pipeline_event_stream(pipeline, heartbeat_seconds=5.0)
+        chunks = await collect(events)
+        await task
+        return chunks
+
+    assert parse_events(asyncio.run(scenario())) == [
+        ("extracted_data", {"nombre": "Ana"}),
+        ("queued", {"lane": "hot"}),
+        ("stored", {"lead_id": "l1"}),
+        ("result", {"lead_id": "l1"}),
+    ]
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (HTTPException(status_code=429, detail="Demasiadas peticiones"), (429, "Demasiadas peticiones")),
+        (RuntimeError("fallo inesperado"), (500, "Error interno")),
+    ],
+)
+def test_pipeline_stream_ends_with_error_event(error, expected):
+    async def pipeline(emit):
+        emit("summary", {"summary": "ok"})
+        raise error
+
+    async def scenario():
+        task, events = pipeline_event_stream(pipeline, heartbeat_seconds=5.0)
+        return await collect(events)
+
+    events = parse_events(asyncio.run(scenario()))
+    status_code, detail = expected
+    assert events == [
+        ("summary", {"summary": "ok"}),
+        ("error", {"status_code": status_code, "detail": detail}),
+    ]
+
+
+def test_on_close_runs_when_body_is_never_iterated():
+    closed = []
+
+    async def body():
+        closed.append("generator")  # no debe llegar a ejecutarse
+        yield "data: {}\n\n"
+
+    async def failing_send(message):
+        raise ConnectionResetError("cliente desconectado")
+
+    async def receive():
+        return {"type": "http.request"}
+
+    response = CleanupStreamingResponse(body(), on_close=lambda: closed.append("closed"))
+    # Según la versión de Starlette el error llega tal cual o envuelto
+    with pytest.raises(Exception):
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, failing_send))
+    assert closed == ["closed"]